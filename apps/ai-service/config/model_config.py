@@ -9,3 +9,10 @@ COST_PER_TOKEN = {
     "text-embedding-3-large": 0.0001,  # Cost per token for the large model.
     "text-embedding-3-small": 0.00005,  # Cost per token for the small model.
 }
+
+MAX_INPUT_TOKENS = {
+    "text-embedding-3-large": 8191,  # Longest single input the model accepts.
+    "text-embedding-3-small": 8191,
+}
+
+MAX_BATCH_TOKENS = 300_000  # Total input tokens allowed in one embeddings request.
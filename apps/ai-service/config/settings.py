@@ -16,6 +16,9 @@ class AppSettings(BaseSettings):
 
     CHATWOOT_API_ACCESS_TOKEN: str = Field(None, env="CHATWOOT_API_ACCESS_TOKEN")
 
+    # Shared cache tier; caching stays in-process when unset
+    REDIS_URL: Optional[str] = Field(None, env="REDIS_URL")
+
     # Any other environment-based settings
     DEFAULT_MAX_TOKENS: int = Field(
         50, description="Default max tokens for completions"
@@ -3,6 +3,9 @@ Main entry point for the AI service application.
 This module initializes the FastAPI application and sets up routes and middleware.
 """
 
+# Standard library imports
+from contextlib import asynccontextmanager
+
 # Third party imports
 import uvicorn
 from fastapi import FastAPI
@@ -12,6 +15,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from config.logging_config import setup_logging
 from src.api.routes import completion, chat, health
 from src.handlers.error_handler import add_exception_handlers
+from src.utils.pdf_processor import shutdown_extraction_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Release worker processes when the application shuts down."""
+    yield
+    shutdown_extraction_pool()
 
 
 def create_app() -> FastAPI:
@@ -25,6 +36,7 @@ def create_app() -> FastAPI:
         redoc_url="/api/v1/redoc",
         openapi_url="/api/v1/openapi.json",
         description="Stateless AI service for LLM processing and streaming responses.",
+        lifespan=lifespan,
     )
 
     # Middleware
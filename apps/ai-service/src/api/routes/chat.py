@@ -3,6 +3,7 @@ import os
 import logging
 import requests
 import requests
+from typing import Optional
 from urllib.parse import urlparse
 
 # Third party imports
@@ -30,6 +31,16 @@ MODEL_ARN = "arn:aws:bedrock:eu-west-1:038547062468:inference-profile/eu.anthrop
 BASE_URL = (
     "http://ergoglobal-chatwoot-alb-1278403382.eu-west-1.elb.amazonaws.com/api/v1"
 )
+# A message sent within this many seconds of its conversation's creation opened it.
+FIRST_MESSAGE_WINDOW = 5
+
+
+def opens_conversation(conversation: dict, message: dict) -> Optional[bool]:
+    """Whether `message` opened `conversation`, from their Chatwoot timestamps; None if unknown."""
+    created, sent = conversation.get("created_at"), message.get("created_at")
+    if not isinstance(created, (int, float)) or not isinstance(sent, (int, float)):
+        return None
+    return sent - created <= FIRST_MESSAGE_WINDOW
 
 
 @router.post("/chatwoot/webhook", tags=["Chat"])
@@ -54,6 +65,7 @@ async def chatwoot_webhook(
             raise KeyError("No messages in payload")
 
         recent_message = messages[0]
+        first_message = opens_conversation(data["conversation"], recent_message)
         conversation_id = recent_message["conversation_id"]
         query = recent_message.get("processed_message_content")
         message_type = recent_message.get("message_type")
@@ -70,7 +82,13 @@ async def chatwoot_webhook(
     except KeyError:
         raise HTTPException(status_code=400, detail={"error_code": "invalid_payload"})
 
-    result = await rag.ai_respond(user_input=query, account_id=account_id, conversation_id=conversation_id, referer_url=base_url)
+    result = await rag.ai_respond(
+        user_input=query,
+        account_id=account_id,
+        conversation_id=conversation_id,
+        referer_url=base_url,
+        first_message=first_message,
+    )
 
     if not result:
         result = "Sorry, I'm having an issue at the moment. Please try again shortly."
@@ -88,6 +106,16 @@ async def chatwoot_webhook(
     return JSONResponse(content={"reply": result}, status_code=200)
 
 
+@router.post("/knowledge-base/invalidate-cache", tags=["Chat"])
+async def invalidate_knowledge_base_cache():
+    """Called after the knowledge base is re-synced, so stale retrievals are not served."""
+    shared = await rag.invalidate_retrieval_cache()
+    return JSONResponse(
+        content={"invalidated": True, "scope": "all_workers" if shared else "this_worker"},
+        status_code=200,
+    )
+
+
 @router.post("/llm/generate", response_model=ChatResponse, tags=["Chat"])
 async def query_knowledge_base(
     request_body: ChatRequest
@@ -6,6 +6,8 @@ from typing import Dict, Any
 
 from fastapi import APIRouter
 
+from src.utils.cache import cache_metrics
+
 router = APIRouter()
 
 
@@ -93,3 +95,9 @@ async def readiness_check() -> Dict[str, Any]:
         }
     except Exception as e:
         return {"status": "error", "can_process_requests": False, "error": str(e)}
+
+
+@router.get("/caches")
+async def cache_health() -> Dict[str, Any]:
+    """Hit, miss and eviction counters of the in-process and shared caches."""
+    return {"caches": cache_metrics(), "timestamp": time.time()}
@@ -1,12 +1,15 @@
 # File: src/llm/embedding_generator.py
 
-from typing import List, Literal
+from typing import List, Literal, Optional, Tuple
 import asyncio
 
+import numpy as np
+
+from src.utils.embedding_cache import EmbeddingCache
 from src.utils.rate_limiter import RateLimiter 
-from src.utils.token_counter import count_tokens 
+from src.utils.token_counter import count_tokens_batch, get_encoding
 from src.utils.logger import logger 
-from config.model_config import EMBEDDING_DIMENSIONS, COST_PER_TOKEN
+from config.model_config import EMBEDDING_DIMENSIONS, COST_PER_TOKEN, MAX_BATCH_TOKENS, MAX_INPUT_TOKENS
 from src.llm.openai_client import OpenAIClient
 
 class EmbeddingGenerator:
@@ -14,26 +17,130 @@ class EmbeddingGenerator:
     A standardized interface for generating embeddings using OpenAI models.
 
     Acceptance criteria implemented:
-    - Batch processing support: Processes texts in batches defined by `batch_size`.
-    - Error handling: Catches and logs exceptions per batch.
-    - Rate limiting: Uses a rate limiter before API calls.
+    - Batch processing support: Packs consecutive texts into batches of at most
+      `batch_size` texts and `max_batch_tokens` tokens, so long texts do not
+      overflow a request and short ones share one.
+    - Oversize inputs: Texts longer than the model's input limit are truncated
+      to it, with a warning.
+    - Concurrency: Keeps up to `max_concurrency` batch requests in flight and
+      reassembles their embeddings in input order.
+    - Error handling: Retries a failed batch up to `max_retries` times with
+      exponential backoff, without resending the other batches.
+    - Rate limiting: Uses a rate limiter before every API call, including retries.
+      Pass a shared RateLimiter to keep several generators under one limit.
     - Cost tracking: Tracks cost per batch using token counts and a cost rate.
+    - Caching: With an EmbeddingCache, texts embedded before by the same model
+      are served from disk, and repeated texts within a call are sent once.
+    - Compact output: Embeddings are returned as one (len(texts), dimensions)
+      float32 array, filled batch by batch without per-float Python objects.
     - Dimension validation: Ensures returned embeddings match expected dimensions.
     - Token counting: Uses a utility function to count tokens per text.
     - Input validation: Validates texts input and supported model.
     """
-    
-    def __init__(self) -> None:
-        self.rate_limiter = RateLimiter()
+
+    def __init__(
+        self,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        max_batch_tokens: int = MAX_BATCH_TOKENS,
+        cache: Optional[EmbeddingCache] = None,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.rate_limiter = rate_limiter or RateLimiter()
         self.client = OpenAIClient()
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_batch_tokens = max_batch_tokens
+        self.cache = cache
         self.total_cost: float = 0.0
-    
+
+    async def _embed_batch(
+        self,
+        batch: List[str],
+        model: str,
+        expected_dimension: int,
+        batch_number: int,
+        batch_tokens: int,
+    ) -> np.ndarray:
+        for attempt in range(self.max_retries + 1):
+            # Enforce rate limiting before calling the API.
+            await self.rate_limiter.wait()
+            try:
+                # Call the OpenAI API asynchronously to generate embeddings for the current batch.
+                embeddings = await self.client.get_embeddings(texts=batch, model=model)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Error generating embeddings for batch {batch_number}: {e}")
+                    raise e
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning(
+                    f"Embedding batch {batch_number} failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}"
+                )
+                await asyncio.sleep(delay)
+
+        # Validate that each returned embedding has the expected dimensions.
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape != (len(batch), expected_dimension):
+            raise ValueError(
+                f"Embedding dimension mismatch. Expected: {expected_dimension} but got {embeddings.shape[1:]}"
+            )
+
+        # Track cost for the batch.
+        cost = batch_tokens * COST_PER_TOKEN.get(model, 0)
+        self.total_cost += cost
+        logger.info(f"Processed batch {batch_number}: {batch_tokens} tokens, cost: {cost:.6f}")
+        return embeddings
+
+    def _truncate(self, text: str, model: str, limit: int) -> Tuple[str, int]:
+        encoding = get_encoding(model)
+        if encoding is None:
+            words = text.split()[:limit]
+            return " ".join(words), len(words)
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:limit]), limit
+
+    def _pack(
+        self,
+        texts: List[str],
+        model: str,
+        batch_size: int,
+        max_batch_tokens: int,
+    ) -> List[Tuple[List[str], int]]:
+        """
+        Greedily packs consecutive texts into (batch, tokens) pairs, counting each
+        text once. Batches stay contiguous, so their results concatenate in input order.
+        """
+        max_input_tokens = min(MAX_INPUT_TOKENS.get(model, max_batch_tokens), max_batch_tokens)
+        batches: List[Tuple[List[str], int]] = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for index, (text, tokens) in enumerate(zip(texts, count_tokens_batch(texts, model=model))):
+            if tokens > max_input_tokens:
+                logger.warning(
+                    f"Text {index} has {tokens} tokens, truncating to the {max_input_tokens} token input limit."
+                )
+                text, tokens = self._truncate(text, model, max_input_tokens)
+            if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+                batches.append((batch, batch_tokens))
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append((batch, batch_tokens))
+        return batches
+
     async def generate(
         self,
         texts: List[str],
         model: Literal["text-embedding-3-large", "text-embedding-3-small"],
-        batch_size: int = 100
-    ) -> List[List[float]]:
+        batch_size: int = 100,
+        max_concurrency: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+    ) -> np.ndarray:
         if not texts:
             raise ValueError("Input texts list is empty.")
         if not all(isinstance(t, str) for t in texts):
@@ -45,37 +152,56 @@ class EmbeddingGenerator:
         if expected_dimension is None:
             raise ValueError(f"No dimension configuration for model: {model}")
 
-        results: List[List[float]] = []
-        
-        # Process texts in batches.
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i : i + batch_size]
-            
-            # Enforce rate limiting before calling the API.
-            await self.rate_limiter.wait()
-            
-            # Count tokens for cost tracking.
-            batch_tokens = sum(count_tokens(text) for text in batch)
-            
-            try:
-                # Call the OpenAI API asynchronously to generate embeddings for the current batch.
-                embeddings = await self.client.get_embeddings(texts=batch, model=model)
-            except Exception as e:
-                logger.error(f"Error generating embeddings for batch starting at index {i}: {e}")
-                raise e
-
-            # Validate that each returned embedding has the expected dimensions.
-            for emb in embeddings:
-                if len(emb) != expected_dimension:
-                    raise ValueError(
-                        f"Embedding dimension mismatch. Expected: {expected_dimension} but got {len(emb)}"
-                    )
-            
-            results.extend(embeddings)
-            
-            # Track cost for the batch.
-            cost = batch_tokens * COST_PER_TOKEN.get(model, 0)
-            self.total_cost += cost
-            logger.info(f"Processed batch {i // batch_size + 1}: {batch_tokens} tokens, cost: {cost:.6f}")
+        if self.cache is None:
+            return await self._embed(texts, model, expected_dimension, batch_size, max_concurrency, max_batch_tokens)
+
+        found = await asyncio.to_thread(self.cache.get_many, model, texts)
+        # Unique uncached texts, in first-seen order.
+        missing = list(dict.fromkeys(text for text in texts if text not in found))
+        if missing:
+            embeddings = await self._embed(
+                missing, model, expected_dimension, batch_size, max_concurrency, max_batch_tokens
+            )
+            new = list(zip(missing, embeddings))
+            await asyncio.to_thread(self.cache.put_many, model, new)
+            found.update(new)
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} of {len(texts)} texts reused")
+        results = np.empty((len(texts), expected_dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            results[row] = found[text]
+        return results
+
+    async def _embed(
+        self,
+        texts: List[str],
+        model: str,
+        expected_dimension: int,
+        batch_size: int,
+        max_concurrency: Optional[int],
+        max_batch_tokens: Optional[int],
+    ) -> np.ndarray:
+        batches = self._pack(texts, model, batch_size, max_batch_tokens or self.max_batch_tokens)
+        results = np.empty((len(texts), expected_dimension), dtype=np.float32)
+        offsets = np.cumsum([0] + [len(batch) for batch, _ in batches]).tolist()
+        pending = iter(range(len(batches)))
+
+        async def worker() -> None:
+            # Each worker keeps one request in flight; results land in their batch's rows.
+            for index in pending:
+                batch, batch_tokens = batches[index]
+                results[offsets[index] : offsets[index + 1]] = await self._embed_batch(
+                    batch, model, expected_dimension, index + 1, batch_tokens
+                )
+
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(min(max_concurrency or self.max_concurrency, len(batches)))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # A batch that failed for good stops the others.
+            for task in workers:
+                task.cancel()
 
         return results
@@ -1,14 +1,23 @@
+import asyncio
+import hashlib
 import json
 import boto3
 import re
 import logging
+import time
 import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+import numpy as np
 from fastapi import HTTPException
 from langchain_core.prompts import PromptTemplate
 from langchain_community.chat_message_histories import ChatMessageHistory
 from src.llm.tools import ToolsList
 from src.utils.constants import routes, tenant_base_urls_set
 from src.prompt_engineering.templates import ERGOGLOBAL_AI_SYSTEM_PROMPT
+from src.utils.cache import LRUCache, RedisCache, TieredCache, get_redis_cache, register_cache
+from src.utils.semantic_cache import SemanticCache
 from src.api.dependencies import (
     get_bedrock_agent_runtime_client,
     get_bedrock_runtime_client,
@@ -22,6 +31,22 @@ logger = logging.getLogger(__name__)
 
 KNOWLEDGE_BASE_ID = "ERJ0GKVEAO"
 MODEL_ARN = "arn:aws:bedrock:eu-west-1:038547062468:inference-profile/eu.anthropic.claude-3-5-sonnet-20240620-v1:0"
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+# Minimum cosine similarity for a previously answered question to be reused.
+ANSWER_CACHE_THRESHOLD = 0.92
+# Cached answers are shared between workers through Redis for a day.
+ANSWER_CACHE_TTL = 86400
+# Retrieval results are reused for an hour, or until the knowledge base is re-synced.
+RETRIEVAL_CACHE_SIZE = 1024
+RETRIEVAL_CACHE_TTL = 3600
+RETRIEVAL_CACHE_MAX_BYTES = 64 << 20
+# Seconds a worker reuses the knowledge base generation it last read from Redis.
+GENERATION_REFRESH_INTERVAL = 5
+# Conversations are remembered in Redis this long to tell first messages from follow-ups.
+CONVERSATION_TTL = 7 * 86400
+
+# Set when the model called a tool while answering; such answers are not cached.
+_tools_used: ContextVar[bool] = ContextVar("tools_used", default=False)
 
 
 class ConversationalRAGWithLangchain:
@@ -31,6 +56,9 @@ class ConversationalRAGWithLangchain:
         bedrock_agent_runtime_client: boto3.client,
         knowledge_base_id: str,
         model_id: str = "anthropic.claude-3-haiku-20240307-v1:0",
+        answer_cache: Optional[SemanticCache] = None,
+        embedding_model_id: str = EMBEDDING_MODEL_ID,
+        retrieval_cache: Optional[TieredCache] = None,
     ) -> None:
         """
         Initializes a conversational RAG agent using AWS Bedrock.
@@ -40,6 +68,10 @@ class ConversationalRAGWithLangchain:
             bedrock_agent_runtime_client (boto3.client): Bedrock Agent runtime client for retrieval.
             knowledge_base_id (str): Bedrock Knowledge Base ID.
             model_id (str): Bedrock model to use (default: Claude 3 Haiku).
+            answer_cache (SemanticCache): Optional cache of answers to previously asked
+                questions, looked up by question embedding.
+            embedding_model_id (str): Bedrock model embedding questions for the answer cache.
+            retrieval_cache (TieredCache): Optional cache of knowledge base retrieval results.
         """
         self.model_id = model_id
         self.bedrock_runtime_client = bedrock_runtime_client
@@ -47,22 +79,137 @@ class ConversationalRAGWithLangchain:
         self.knowledge_base_id = knowledge_base_id
         # Instantiate memory to keep conversation history
         self.memory = ChatMessageHistory()
+        self.answer_cache = answer_cache
+        self.embedding_model_id = embedding_model_id
+        self.retrieval_cache = retrieval_cache
+        # Bumped on every invalidation; part of every retrieval key and answer namespace.
+        self._generation = 0
+        self._generation_checked = float("-inf")
+
+    def _generation_key(self) -> str:
+        return f"generation:{self.knowledge_base_id}"
+
+    def _shared_tier(self) -> Optional[RedisCache]:
+        return self.retrieval_cache.shared if self.retrieval_cache is not None else None
+
+    def _set_generation(self, generation: int) -> None:
+        if generation == self._generation:
+            return
+        self._generation = generation
+        # Entries of other generations can no longer be hit; free them.
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.clear()
+        if self.answer_cache is not None:
+            self.answer_cache.clear()
+
+    async def _current_generation(self) -> int:
+        # With a shared tier the generation is a Redis counter, so an invalidation
+        # received by one worker applies to every worker within
+        # GENERATION_REFRESH_INTERVAL seconds. Between reads the last value is used.
+        shared = self._shared_tier()
+        now = time.monotonic()
+        if shared is not None and now - self._generation_checked >= GENERATION_REFRESH_INTERVAL:
+            self._generation_checked = now
+            generation = await asyncio.to_thread(shared.counter, self._generation_key())
+            if generation is not None:
+                self._set_generation(generation)
+        return self._generation
+
+    def _retrieval_key(self, q: str, top_k: int, generation: int) -> str:
+        normalized = " ".join(q.lower().split()).rstrip("?!. ")
+        key = json.dumps([generation, self.knowledge_base_id, top_k, normalized])
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    async def invalidate_retrieval_cache(self) -> bool:
+        """
+        Drops cached retrieval results and answers; call after the knowledge base is re-synced.
 
-    def retrieve_top_k_chunks(self, q: str, top_k: int = 3):
-        """Retrieve the top-K context chunks from the knowledge base."""
-        response = self.bedrock_agent_runtime_client.retrieve(
-            knowledgeBaseId=self.knowledge_base_id,
-            retrievalQuery={"text": q},
-            retrievalConfiguration={
-                "vectorSearchConfiguration": {"numberOfResults": top_k}
-            },
-        )
+        Returns:
+            bool: True when every worker sees the invalidation, False when only this
+            worker's caches were dropped (no Redis tier, or Redis failed).
+        """
+        shared = self._shared_tier()
+        generation = None
+        if shared is not None:
+            generation = await asyncio.to_thread(shared.incr, self._generation_key())
+            self._generation_checked = time.monotonic()
+        if generation is None:
+            self._set_generation(self._generation + 1)
+            logger.warning(
+                f"Knowledge base {self.knowledge_base_id} invalidated on this worker only; "
+                f"other workers keep cached retrievals for up to {RETRIEVAL_CACHE_TTL} seconds."
+            )
+            return False
+        self._set_generation(generation)
+        logger.info(f"Retrieval cache invalidated for knowledge base {self.knowledge_base_id}.")
+        return True
+
+    async def retrieve_top_k_chunks(self, q: str, top_k: int = 3):
+        """
+        Retrieve the top-K context chunks from the knowledge base. Results are cached
+        by normalized query, knowledge base and top_k when a retrieval cache is set.
+        Redis and Bedrock calls run in a thread, so they do not block the event loop.
+        """
+        cache_key = None
+        search_results = None
+        if self.retrieval_cache is not None:
+            cache_key = self._retrieval_key(q, top_k, await self._current_generation())
+            hit, search_results = self.retrieval_cache.local.get(cache_key)
+            if not hit:
+                hit, search_results = await self.retrieval_cache.aget_shared(cache_key)
+            if hit:
+                logger.info("Retrieval cache hit.")
+
+        if search_results is None:
+            response = await asyncio.to_thread(
+                self.bedrock_agent_runtime_client.retrieve,
+                knowledgeBaseId=self.knowledge_base_id,
+                retrievalQuery={"text": q},
+                retrievalConfiguration={
+                    "vectorSearchConfiguration": {"numberOfResults": top_k}
+                },
+            )
+            search_results = response.get("retrievalResults", [])
+            if cache_key is not None:
+                await self.retrieval_cache.aput(cache_key, search_results)
 
-        search_results = response.get("retrievalResults", [])
         context_chunks = [r["content"]["text"] for r in search_results]
         context_string = "\n".join(context_chunks)
         return context_string, search_results
 
+    async def embed_question(self, q: str) -> Optional[np.ndarray]:
+        """Embeds a question for the answer cache; returns None if embedding fails."""
+        try:
+            response = await asyncio.to_thread(
+                self.bedrock_runtime_client.invoke_model,
+                modelId=self.embedding_model_id,
+                body=json.dumps({"inputText": q, "normalize": True}),
+                contentType="application/json",
+                accept="application/json",
+            )
+            embedding = json.loads(response["body"].read())["embedding"]
+            return np.asarray(embedding, dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Question embedding failed, skipping the answer cache: {str(e)}")
+            return None
+
+    async def _starts_conversation(self, conversation_id: str, first_message: Optional[bool]) -> bool:
+        """
+        Whether this message has no earlier history the answer could depend on.
+        What the request says wins; otherwise a conversation is first seen when
+        its marker is set in Redis, which every worker shares and which survives
+        restarts. Without either, the message is assumed to be a follow-up.
+        """
+        if first_message is not None:
+            return first_message
+        if not conversation_id:
+            return not self.memory.messages
+        shared = self._shared_tier()
+        if shared is None:
+            return False
+        claimed = await asyncio.to_thread(shared.claim, f"conversation:{conversation_id}", CONVERSATION_TTL)
+        return bool(claimed)
+
     async def call_bedrock_generate_with_zero_shot_fallback(
         self,
         query: str,
@@ -188,6 +335,7 @@ class ConversationalRAGWithLangchain:
                 if "toolUse" in c
             ]
             if function_calling:
+                _tools_used.set(True)
                 messages = []
                 messages.append(result["output"]["message"])
                 tool_result_message = {"role": "user", "content": []}
@@ -285,12 +433,37 @@ class ConversationalRAGWithLangchain:
         account_id: str = "",
         conversation_id: str = "",
         referer_url: str = "",
+        first_message: Optional[bool] = None,
     ):
-        """Responds to user input using retrieved context and conversation memory."""
+        """
+        Responds to user input using retrieved context and conversation memory.
+
+        With an answer cache, the first message of a conversation is compared with
+        questions already answered for the same referer; a close enough match
+        returns the cached answer without retrieval or generation. Pass
+        `first_message` when the request tells whether the message opens its
+        conversation.
+        """
         if not user_input:
             raise ValueError("user_input cannot be empty.")
 
-        context_string, _ = self.retrieve_top_k_chunks(q=user_input)
+        question_vector = None
+        if self.answer_cache is not None and await self._starts_conversation(conversation_id, first_message):
+            question_vector = await self.embed_question(user_input)
+            answer_namespace = f"{await self._current_generation()}:{referer_url}"
+            cached = (
+                await self.answer_cache.alookup(answer_namespace, question_vector)
+                if question_vector is not None
+                else None
+            )
+            if cached is not None:
+                ai_output, similarity = cached
+                logger.info(f"Answer cache hit (similarity {similarity:.3f}).")
+                self.memory.add_user_message(user_input)
+                self.memory.add_ai_message(ai_output)
+                return ai_output
+
+        context_string, _ = await self.retrieve_top_k_chunks(q=user_input)
 
         # Format prompt with history and input
         formatted_history = "\n".join(
@@ -300,6 +473,7 @@ class ConversationalRAGWithLangchain:
             ]
         )
 
+        _tools_used.set(False)
         ai_output = await self.call_bedrock_generate_with_zero_shot_fallback(
             query=user_input,
             context=context_string,
@@ -309,6 +483,10 @@ class ConversationalRAGWithLangchain:
             referer_url=referer_url,
         )
 
+        # Answers that ran a tool (e.g. offloading to an agent) must not be replayed.
+        if question_vector is not None and ai_output and not _tools_used.get():
+            await self.answer_cache.astore(answer_namespace, question_vector, ai_output)
+
         # Store messages
         self.memory.add_user_message(user_input)
         self.memory.add_ai_message(ai_output)
@@ -321,4 +499,16 @@ rag = ConversationalRAGWithLangchain(
     bedrock_agent_runtime_client=get_bedrock_agent_runtime_client(),
     knowledge_base_id=KNOWLEDGE_BASE_ID,
     model_id=MODEL_ARN,
+    answer_cache=SemanticCache(
+        threshold=ANSWER_CACHE_THRESHOLD,
+        ttl=ANSWER_CACHE_TTL,
+        shared=get_redis_cache(ttl=ANSWER_CACHE_TTL),
+    ),
+    retrieval_cache=TieredCache(
+        LRUCache(maxsize=RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL, max_bytes=RETRIEVAL_CACHE_MAX_BYTES),
+        get_redis_cache(ttl=RETRIEVAL_CACHE_TTL),
+        namespace="retrieval",
+    ),
 )
+register_cache("rag.retrieval", rag.retrieval_cache)
+register_cache("rag.answers", rag.answer_cache)
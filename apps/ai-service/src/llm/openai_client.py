@@ -1,7 +1,9 @@
 # src/llm/openai_client.py
+import base64
 import logging
 import openai
 import asyncio
+import numpy as np
 from typing import Optional, Any, Dict, AsyncGenerator, Union, List
 from src.llm.base import BaseLLMClient
 
@@ -257,37 +259,42 @@ class OpenAIClient(BaseLLMClient):
             )
             raise e
 
-    async def get_embeddings(self, texts: List[str], model: str) -> List[List[float]]:
+    async def get_embeddings(self, texts: List[str], model: str) -> np.ndarray:
         """
         Asynchronously retrieve embeddings for a list of texts using OpenAI's Embedding API.
+        Embeddings are requested base64-encoded and decoded straight into float32, so no
+        Python float is created per dimension.
 
         :param texts: List of input texts to generate embeddings.
         :param model: The model identifier for generating embeddings.
-        :return: A list of embeddings where each embedding is a list of floats.
+        :return: A (len(texts), dimensions) float32 array, one row per text.
         """
         if not texts:
             raise ValueError("No texts provided for embedding generation.")
 
         try:
             if self.use_async:
-                response = await self.client.embeddings.create(input=texts, model=model)
+                response = await self.client.embeddings.create(
+                    input=texts, model=model, encoding_format="base64"
+                )
             else:
                 response = await asyncio.to_thread(
-                    self.client.embeddings.create, input=texts, model=model
+                    self.client.embeddings.create, input=texts, model=model, encoding_format="base64"
                 )
         except Exception as e:
             logger.exception("OpenAIClient: Error generating embeddings")
             raise e
 
-        if not response or "data" not in response:
+        data = getattr(response, "data", None)
+        if not data or len(data) != len(texts):
             logger.error("OpenAIClient: Invalid response structure for embeddings")
             raise ValueError("Invalid response structure for embeddings")
 
-        embeddings = []
-        for item in response["data"]:
-            if "embedding" not in item:
+        rows = []
+        for item in sorted(data, key=lambda item: item.index):
+            if not getattr(item, "embedding", None):
                 logger.error("OpenAIClient: Missing 'embedding' in response data item")
                 raise ValueError("Invalid response structure: missing 'embedding'")
-            embeddings.append(item["embedding"])
+            rows.append(np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32))
 
-        return embeddings
+        return np.vstack(rows)
@@ -0,0 +1,124 @@
+# src/utils/bm25.py
+import math
+import re
+from itertools import chain
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.utils.growable_array import GrowableArray
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokenization shared by indexing and querying."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class _Posting:
+    __slots__ = ("rows", "freqs")
+
+    def __init__(self):
+        self.rows = GrowableArray((), dtype=np.int64, capacity=4)
+        self.freqs = GrowableArray((), dtype=np.float32, capacity=4)
+
+
+class BM25Index:
+    """
+    Tokenized inverted index with Okapi BM25 scoring.
+
+    Rows are appended in increasing order, so each posting list is sorted.
+    Removed rows keep their postings (the caller filters them out, e.g. with
+    tombstones) but stop counting towards document frequencies and the
+    average document length.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_ids: Dict[str, int] = {}
+        self._postings: List[_Posting] = []
+        self._doc_freq = GrowableArray((), dtype=np.int64)
+        self._doc_lengths = GrowableArray((), dtype=np.float32)
+        self._live_docs = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def _term_id_array(self, tokens: List[str]) -> np.ndarray:
+        term_ids = self._term_ids
+        # Unknown terms get the next free id.
+        for token in set(tokens).difference(term_ids):
+            term_ids[token] = len(term_ids)
+        ids = np.fromiter(map(term_ids.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+        new_terms = len(term_ids) - len(self._postings)
+        if new_terms:
+            self._postings.extend(_Posting() for _ in range(new_terms))
+            self._doc_freq.append(np.zeros(new_terms, dtype=np.int64))
+        return ids
+
+    def add(self, texts: List[str]) -> None:
+        """Index the texts of the next `len(texts)` rows."""
+        if not texts:
+            return
+        start = len(self)
+        tokenized = [tokenize(text) for text in texts]
+        lengths = np.fromiter(map(len, tokenized), dtype=np.int64, count=len(tokenized))
+        term_ids = self._term_id_array(list(chain.from_iterable(tokenized)))
+        local_rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+
+        # Sorting by (term, row) groups each term's postings in row order and
+        # the run lengths are the term frequencies.
+        keys, freqs = np.unique(term_ids * len(texts) + local_rows, return_counts=True)
+        terms, rows = np.divmod(keys, len(texts))
+        boundaries = np.flatnonzero(np.diff(terms)) + 1
+        for begin, end in zip(np.r_[0, boundaries].tolist(), np.r_[boundaries, len(keys)].tolist()):
+            if begin == end:
+                continue
+            posting = self._postings[int(terms[begin])]
+            posting.rows.append(rows[begin:end] + start)
+            posting.freqs.append(freqs[begin:end])
+        self._doc_freq.view()[:] += np.bincount(terms, minlength=len(self._postings))
+
+        self._doc_lengths.append(lengths)
+        self._live_docs += len(texts)
+        self._total_length += int(lengths.sum())
+
+    def remove(self, texts: List[str]) -> None:
+        """Drop removed rows (given by their texts) from the corpus statistics."""
+        doc_freq = self._doc_freq.view()
+        for text in texts:
+            tokens = tokenize(text)
+            for token in set(tokens):
+                doc_freq[self._term_ids[token]] -= 1
+            self._total_length -= len(tokens)
+        self._live_docs -= len(texts)
+
+    def score(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every row containing at least one query term.
+
+        Returns:
+            Tuple of (rows, scores), rows sorted ascending.
+        """
+        terms = [self._term_ids[term] for term in set(tokenize(query)) if term in self._term_ids]
+        if not terms or self._live_docs <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        average_length = max(self._total_length / self._live_docs, 1.0)
+        lengths = self._doc_lengths.view()
+        doc_freqs = self._doc_freq.view()
+        scores = np.zeros(len(self), dtype=np.float32)
+        matched = []
+        for term in terms:
+            posting = self._postings[term]
+            rows, freqs = posting.rows.view(), posting.freqs.view()
+            doc_freq = max(int(doc_freqs[term]), 0)
+            idf = math.log(1.0 + (self._live_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[rows] / average_length)
+            scores[rows] += idf * freqs * (self.k1 + 1.0) / (freqs + norm)
+            matched.append(rows)
+        rows = np.unique(np.concatenate(matched))
+        return rows, scores[rows]
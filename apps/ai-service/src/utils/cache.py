@@ -1,32 +1,68 @@
 # src/utils/cache.py
+import asyncio
 import functools
+import inspect
 import logging
 import time
 import hashlib
 import json
-from typing import Any, Callable, Dict, Optional, Tuple, Union
+import sys
+import threading
+import weakref
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+try:
+    import redis
+except ImportError:
+    redis = None
+
 class LRUCache:
     """
     LRU (Least Recently Used) cache implementation with TTL support.
+
+    Bounded by entry count and, optionally, by the approximate size in bytes of
+    the cached values, so a few very large responses cannot exhaust memory.
+    Expired entries are dropped when read and swept from the whole cache at most
+    once per TTL period, so entries that are never read again do not linger.
     """
-    def __init__(self, maxsize: int = 128, ttl: Optional[int] = None):
+    def __init__(self, maxsize: int = 128, ttl: Optional[int] = None, max_bytes: Optional[int] = None):
         """
         Initialize LRU cache.
         
         Args:
             maxsize: Maximum number of items to store in cache
             ttl: Time-to-live in seconds, None means no expiration
+            max_bytes: Maximum approximate size of the cached values, None means unbounded
         """
         self.maxsize = maxsize
         self.ttl = ttl
-        self.cache = OrderedDict()  # {key: (value, timestamp)}
+        self.max_bytes = max_bytes
+        self.cache = OrderedDict()  # {key: (value, timestamp, size)}
+        self.size_bytes = 0
         self.hits = 0
         self.misses = 0
-    
+        self.evictions = 0
+        self.expirations = 0
+        self._next_sweep = time.time() + ttl if ttl is not None else None
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self.cache.pop(key)
+        self.size_bytes -= size
+
+    def _sweep(self, now: float) -> None:
+        # Lazy TTL sweep: a full pass at most once per TTL period.
+        if self._next_sweep is None or now < self._next_sweep:
+            return
+        expired = [key for key, (_, timestamp, _) in self.cache.items() if now - timestamp > self.ttl]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        self._next_sweep = now + self.ttl
+
     def get(self, key: str) -> Tuple[bool, Any]:
         """
         Get item from cache.
@@ -37,15 +73,17 @@ class LRUCache:
         Returns:
             Tuple of (hit, value). If hit is False, value is None.
         """
-        if key not in self.cache:
+        entry = self.cache.get(key)
+        if entry is None:
             self.misses += 1
             return False, None
         
-        value, timestamp = self.cache[key]
+        value, timestamp, _ = entry
         
         # Check if entry has expired
         if self.ttl is not None and time.time() - timestamp > self.ttl:
-            del self.cache[key]
+            self._remove(key)
+            self.expirations += 1
             self.misses += 1
             return False, None
         
@@ -62,20 +100,40 @@ class LRUCache:
             key: Cache key
             value: Value to store
         """
-        # If key exists, update and move to end
+        now = time.time()
+        self._sweep(now)
+        size = _approximate_size(value) if self.max_bytes is not None else 0
+
+        # If key exists, replace it
         if key in self.cache:
-            self.cache.move_to_end(key)
-        
+            self._remove(key)
+
+        # A value larger than the whole budget is not cached
+        if self.max_bytes is not None and size > self.max_bytes:
+            logger.debug(f"Value of {size} bytes exceeds the cache budget of {self.max_bytes} bytes")
+            return
+
         # Add new entry
-        self.cache[key] = (value, time.time())
+        self.cache[key] = (value, now, size)
+        self.size_bytes += size
         
-        # Remove oldest item if maxsize exceeded
-        if len(self.cache) > self.maxsize:
-            self.cache.popitem(last=False)
+        # Remove oldest items while maxsize or max_bytes is exceeded
+        while len(self.cache) > self.maxsize or (
+            self.max_bytes is not None and self.size_bytes > self.max_bytes
+        ):
+            oldest = next(iter(self.cache))
+            self._remove(oldest)
+            self.evictions += 1
     
+    def delete(self, key: str) -> None:
+        """Remove an item from the cache, if present."""
+        if key in self.cache:
+            self._remove(key)
+
     def clear(self) -> None:
         """Clear the cache."""
         self.cache.clear()
+        self.size_bytes = 0
     
     def get_stats(self) -> Dict[str, Union[int, float]]:
         """Get cache statistics."""
@@ -86,59 +144,496 @@ class LRUCache:
             "misses": self.misses,
             "total": total,
             "hit_rate": hit_rate,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
             "size": len(self.cache),
             "maxsize": self.maxsize,
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+def _approximate_size(value: Any) -> int:
+    """Approximate memory footprint of a value, following lists, tuples and dicts."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_approximate_size(k) + _approximate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_approximate_size(item) for item in value)
+    return size
+
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def _json_native(value: Any) -> bool:
+    """Whether `value` comes back from a JSON round trip unchanged: no tuples, sets, subclasses or non-string keys."""
+    if type(value) in _JSON_SCALARS:
+        return True
+    if type(value) is list:
+        return all(_json_native(item) for item in value)
+    if type(value) is dict:
+        return all(type(key) is str and _json_native(item) for key, item in value.items())
+    return False
+
+
+class RedisCache:
+    """
+    Shared cache tier backed by Redis, so every worker behind the load balancer
+    reuses the same entries.
+
+    Values are stored as compact JSON, zlib-compressed past `compress_threshold`
+    bytes, and expire after `ttl` seconds. Only values made of JSON types (dict
+    with string keys, list, str, int, float, bool, None) are stored, so a hit
+    returns exactly what was cached; anything else stays in the local tier.
+    Redis being slow or unavailable never fails a request: errors are logged
+    and counted, and the lookup is a miss.
+    After a failure Redis is skipped for `retry_after` seconds, so an outage
+    costs one timeout per interval rather than one per call.
+
+    Counters (`incr`, `counter`) are plain Redis integers and never expire.
+    Lists (`push`, `tail`) expire `ttl` seconds after their last push.
+
+    `client` is anything with Redis' `get`, `set(name, value, ex=..., nx=...)`,
+    `delete`, `incr`, `rpush`, `ltrim`, `lrange` and `expire` methods, e.g.
+    `redis.Redis` or an in-memory fake in tests.
+    """
+    def __init__(
+        self,
+        client: Any,
+        ttl: Optional[int] = 3600,
+        prefix: str = "ai-service:cache:",
+        compress_threshold: int = 1024,
+        retry_after: float = 5.0,
+    ):
+        """
+        Initialize the Redis tier.
+
+        Args:
+            client: Redis client (or compatible fake)
+            ttl: Time-to-live in seconds, None means no expiration
+            prefix: Prefix of every key written by this cache
+            compress_threshold: Serialized size in bytes above which values are compressed
+            retry_after: Seconds Redis is skipped after a failed call
+        """
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.compress_threshold = compress_threshold
+        self.retry_after = retry_after
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._retry_at = 0.0
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    def _failed(self, action: str, error: Exception) -> None:
+        self.errors += 1
+        self._retry_at = time.monotonic() + self.retry_after
+        logger.warning(f"Redis {action} failed, skipping Redis for {self.retry_after}s: {error}")
+
+    def _dumps(self, value: Any) -> bytes:
+        data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+        if len(data) > self.compress_threshold:
+            return b"z" + zlib.compress(data)
+        return b"j" + data
+
+    def _loads(self, data: bytes) -> Any:
+        if data[:1] == b"z":
+            return json.loads(zlib.decompress(data[1:]))
+        return json.loads(data[1:])
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Get item from Redis.
+
+        Returns:
+            Tuple of (hit, value). If hit is False, value is None.
+        """
+        if self._available():
+            try:
+                data = self.client.get(self.prefix + key)
+                if data is not None:
+                    value = self._loads(data)
+                    self.hits += 1
+                    return True, value
+            except Exception as e:
+                self._failed("cache read", e)
+        self.misses += 1
+        return False, None
+
+    def _payload(self, value: Any) -> Optional[bytes]:
+        if not _json_native(value):
+            self.errors += 1
+            logger.debug(f"Value of type {type(value).__name__} not cached in Redis, it does not round-trip through JSON")
+            return None
+        try:
+            return self._dumps(value)
+        except (TypeError, ValueError) as e:
+            self.errors += 1
+            logger.debug(f"Value not cached in Redis, it is not JSON-serializable: {e}")
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        """Store item in Redis. Values that are not made of JSON types are skipped."""
+        payload = self._payload(value)
+        if payload is None:
+            return
+        if not self._available():
+            return
+        try:
+            self.client.set(self.prefix + key, payload, ex=self.ttl)
+        except Exception as e:
+            self._failed("cache write", e)
+
+    def delete(self, key: str) -> None:
+        if not self._available():
+            return
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            self._failed("cache delete", e)
+
+    def push(self, key: str, value: Any, max_length: int) -> None:
+        """Append `value` to the list `key`, keeping its last `max_length` items."""
+        payload = self._payload(value)
+        if payload is None or not self._available():
+            return
+        name = self.prefix + key
+        try:
+            self.client.rpush(name, payload)
+            self.client.ltrim(name, -max_length, -1)
+            if self.ttl is not None:
+                self.client.expire(name, self.ttl)
+        except Exception as e:
+            self._failed("list write", e)
+
+    def tail(self, key: str, count: int) -> Optional[List[Any]]:
+        """Last `count` items of the list `key`, oldest first, or None if Redis is unavailable."""
+        if not self._available():
+            return None
+        try:
+            return [self._loads(item) for item in self.client.lrange(self.prefix + key, -count, -1)]
+        except Exception as e:
+            self._failed("list read", e)
+            return None
+
+    def claim(self, key: str, ttl: Optional[int] = None) -> Optional[bool]:
+        """
+        Set the marker `key` unless it exists, expiring after `ttl` seconds (default:
+        the cache TTL). Returns True if this call set it, False if it already existed,
+        or None if Redis is unavailable.
+        """
+        if not self._available():
+            return None
+        try:
+            return bool(self.client.set(self.prefix + key, b"1", nx=True, ex=ttl or self.ttl))
+        except Exception as e:
+            self._failed("marker write", e)
+            return None
+
+    def incr(self, key: str) -> Optional[int]:
+        """Atomically increment the counter `key` and return its new value, or None if Redis failed."""
+        try:
+            return int(self.client.incr(self.prefix + key))
+        except Exception as e:
+            self._failed("counter increment", e)
+            return None
+
+    def counter(self, key: str) -> Optional[int]:
+        """Current value of the counter `key`, 0 when unset, or None if Redis is unavailable."""
+        if not self._available():
+            return None
+        try:
+            value = self.client.get(self.prefix + key)
+            return int(value) if value is not None else 0
+        except Exception as e:
+            self._failed("counter read", e)
+            return None
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        """Get cache statistics."""
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total) * 100 if total > 0 else 0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "total": total,
+            "hit_rate": hit_rate,
+            "errors": self.errors,
+        }
+
+
+class TieredCache:
+    """
+    Two-tier cache: an in-process LRUCache (L1) in front of an optional shared
+    RedisCache (L2). L2 hits are copied into L1, and writes go to both tiers.
+
+    The async methods run Redis calls in a thread, so they do not block the
+    event loop.
+    """
+    def __init__(self, local: LRUCache, shared: Optional[RedisCache] = None, namespace: str = ""):
+        """
+        Initialize the tiers.
+
+        Args:
+            local: In-process L1 cache
+            shared: Redis L2 cache, None for an L1-only cache
+            namespace: Prefix of this cache's keys in L2, which is shared by many caches
+        """
+        self.local = local
+        self.shared = shared
+        self.namespace = namespace
+
+    def _shared_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}" if self.namespace else key
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        hit, value = self.local.get(key)
+        if hit or self.shared is None:
+            return hit, value
+        hit, value = self.shared.get(self._shared_key(key))
+        if hit:
+            self.local.put(key, value)
+        return hit, value
+
+    def put(self, key: str, value: Any) -> None:
+        self.local.put(key, value)
+        if self.shared is not None:
+            self.shared.put(self._shared_key(key), value)
+
+    async def aget_shared(self, key: str) -> Tuple[bool, Any]:
+        """Look `key` up in L2 only, copying a hit into L1."""
+        if self.shared is None:
+            return False, None
+        hit, value = await asyncio.to_thread(self.shared.get, self._shared_key(key))
+        if hit:
+            self.local.put(key, value)
+        return hit, value
+
+    async def aput(self, key: str, value: Any) -> None:
+        self.local.put(key, value)
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.put, self._shared_key(key), value)
+
+    def delete(self, key: str) -> None:
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(self._shared_key(key))
+
+    def clear(self) -> None:
+        """Clear the in-process tier. Shared entries expire through their TTL."""
+        self.local.clear()
+
+    def get_stats(self) -> Dict[str, Optional[Dict[str, Union[int, float]]]]:
+        """Get statistics of each tier."""
+        return {
+            "l1": self.local.get_stats(),
+            "l2": self.shared.get_stats() if self.shared is not None else None,
         }
 
+
+@functools.lru_cache(maxsize=None)
+def get_redis_cache(ttl: Optional[int] = 3600) -> Optional[RedisCache]:
+    """
+    The process-wide Redis tier configured by REDIS_URL, or None when REDIS_URL
+    is unset or the redis library is missing.
+    """
+    from config.settings import settings
+
+    if not settings.REDIS_URL:
+        return None
+    if redis is None:
+        logger.warning("REDIS_URL is set but the redis library is not installed. Shared caching disabled.")
+        return None
+    client = redis.Redis.from_url(
+        settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+    )
+    return RedisCache(client, ttl=ttl)
+
+
+# Strings at least this long are hashed once and fed to the key by digest.
+_DIGEST_MIN_LENGTH = 256
+# Bytes of string the digest memo may keep alive.
+_DIGEST_MEMO_MAX_BYTES = 8 << 20
+
+_digests: "OrderedDict[str, bytes]" = OrderedDict()
+_digests_bytes = 0
+_digests_lock = threading.Lock()
+
+
+def _string_digest(text: str) -> bytes:
+    # Message histories repeat across calls, so each message text is hashed once.
+    # The memo holds the strings themselves, so it is bounded by their size.
+    global _digests_bytes
+    with _digests_lock:
+        digest = _digests.get(text)
+        if digest is not None:
+            _digests.move_to_end(text)
+            return digest
+    digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    size = sys.getsizeof(text)
+    if size > _DIGEST_MEMO_MAX_BYTES // 16:
+        return digest
+    with _digests_lock:
+        if text not in _digests:
+            _digests[text] = digest
+            _digests_bytes += size
+            while _digests_bytes > _DIGEST_MEMO_MAX_BYTES:
+                _digests_bytes -= sys.getsizeof(_digests.popitem(last=False)[0])
+    return digest
+
+
+def _feed(h: "hashlib._Hash", value: Any) -> None:
+    # Canonical encoding: a type tag, then the value; containers are length-prefixed.
+    if isinstance(value, str):
+        if len(value) >= _DIGEST_MIN_LENGTH:
+            h.update(b"S")
+            h.update(_string_digest(value))
+        else:
+            data = value.encode()
+            h.update(b"s%d:" % len(data))
+            h.update(data)
+    elif value is None or isinstance(value, (bool, int, float)):
+        h.update(b"n" + repr(value).encode() + b";")
+    elif isinstance(value, (list, tuple)):
+        h.update(b"l%d:" % len(value))
+        for item in value:
+            _feed(h, item)
+    elif isinstance(value, dict):
+        h.update(b"d%d:" % len(value))
+        for key in sorted(value, key=str):
+            _feed(h, str(key))
+            _feed(h, value[key])
+    else:
+        # Other objects are keyed by their string form
+        _feed(h, str(value))
+
+
 def _hash_args(*args, **kwargs) -> str:
     """
     Create a hash from function arguments.
     Handles complex types like lists and dicts.
     """
-    # Convert args and kwargs to a stable JSON representation
-    serialized = json.dumps((args, kwargs), sort_keys=True, default=str)
-    return hashlib.md5(serialized.encode()).hexdigest()
+    h = hashlib.blake2b(digest_size=16)
+    _feed(h, args)
+    _feed(h, kwargs)
+    return h.hexdigest()
+
+
+_registry: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+
+
+def register_cache(name: str, cache: Any) -> None:
+    """Make a cache's counters available through `cache_metrics` under `name`."""
+    _registry[name] = cache
+
+
+def cache_metrics() -> Dict[str, Any]:
+    """Counters (hits, misses, evictions, ...) of every registered cache, by name."""
+    return {name: cache.get_stats() for name, cache in list(_registry.items())}
+
 
-def lru_model_cache(maxsize: int = 100, ttl: Optional[int] = 3600):
+def lru_model_cache(
+    maxsize: int = 100,
+    ttl: Optional[int] = 3600,
+    shared: Optional[RedisCache] = None,
+    max_bytes: Optional[int] = None,
+):
     """
     Decorator that caches function results using an LRU cache.
     Specifically designed for LLM responses with model awareness.
-    
+
+    Works on both regular and `async def` functions. For coroutine functions the
+    awaited result is cached, and concurrent calls with the same arguments are
+    coalesced: the first one runs the function and the others await its result,
+    so a burst of identical requests makes a single upstream call. Exceptions are
+    propagated to every waiter and not cached.
+
+    With `shared` (e.g. `get_redis_cache()`), results are also stored in Redis
+    under the function's qualified name, so other workers reuse them. The cache's
+    counters are published through `cache_metrics` under the same name.
+
     Args:
         maxsize: Maximum number of items to store in cache
         ttl: Cache time-to-live in seconds (default: 1 hour)
+        shared: Optional Redis tier behind the in-process cache
+        max_bytes: Maximum approximate size of the cached results, None means unbounded
     """
-    cache = LRUCache(maxsize=maxsize, ttl=ttl)
-    
+    def make_key(args: tuple, kwargs: Dict[str, Any]) -> str:
+        # Create a cache key using all args and selected kwargs
+        # We filter out kwargs that would change the response (like temperature)
+        cacheable_kwargs = {k: v for k, v in kwargs.items()
+                          if k not in ['stream', 'user', 'request_id']}
+        return _hash_args(*args, **cacheable_kwargs)
+
     def decorator(func: Callable) -> Callable:
+        name = f"{func.__module__}.{func.__qualname__}"
+        cache = TieredCache(LRUCache(maxsize=maxsize, ttl=ttl, max_bytes=max_bytes), shared, namespace=name)
+        register_cache(name, cache)
+
+        if inspect.iscoroutinefunction(func):
+            # Calls currently running, by cache key.
+            in_flight: Dict[str, asyncio.Task] = {}
+
+            async def load(cache_key: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+                hit, value = await cache.aget_shared(cache_key)
+                if hit:
+                    logger.info(f"Shared cache hit for {func.__name__}")
+                    return value
+                logger.info(f"Cache miss for {func.__name__}")
+                result = await func(*args, **kwargs)
+                await cache.aput(cache_key, result)
+                return result
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                # Skip caching for anything with 'stream=True' in kwargs
+                if kwargs.get('stream') is True:
+                    logger.debug("Skipping cache for streaming request")
+                    return await func(*args, **kwargs)
+
+                cache_key = make_key(args, kwargs)
+                hit, cached_result = cache.local.get(cache_key)
+                if hit:
+                    logger.info(f"Cache hit for {func.__name__}")
+                    return cached_result
+
+                task = in_flight.get(cache_key)
+                if task is None:
+                    task = asyncio.ensure_future(load(cache_key, args, kwargs))
+                    in_flight[cache_key] = task
+                    task.add_done_callback(lambda _: in_flight.pop(cache_key, None))
+                else:
+                    logger.info(f"Joining in-flight call for {func.__name__}")
+
+                # Shielded, so one caller being cancelled does not cancel the others.
+                return await asyncio.shield(task)
+
+            async_wrapper.cache = cache
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             # Skip caching for anything with 'stream=True' in kwargs
             if kwargs.get('stream') is True:
                 logger.debug("Skipping cache for streaming request")
                 return func(*args, **kwargs)
-            
-            # Create a cache key using all args and selected kwargs
-            # We filter out kwargs that would change the response (like temperature)
-            cacheable_kwargs = {k: v for k, v in kwargs.items() 
-                              if k not in ['stream', 'user', 'request_id']}
-            
-            cache_key = _hash_args(*args, **cacheable_kwargs)
+
+            cache_key = make_key(args, kwargs)
             hit, cached_result = cache.get(cache_key)
-            
+
             if hit:
                 logger.info(f"Cache hit for {func.__name__}")
                 return cached_result
-            
+
             logger.info(f"Cache miss for {func.__name__}")
             result = func(*args, **kwargs)
             cache.put(cache_key, result)
-            
-            # Log stats occasionally
-            if (cache.hits + cache.misses) % 100 == 0:
-                stats = cache.get_stats()
-                logger.info(f"Cache stats for {func.__name__}: {stats}")
-                
+
             return result
+
+        wrapper.cache = cache
         return wrapper
     return decorator
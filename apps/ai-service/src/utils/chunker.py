@@ -0,0 +1,133 @@
+# src/utils/chunker.py
+import logging
+import re
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Deque, Iterator, List, Tuple
+
+from src.utils.token_counter import get_encoding
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@lru_cache(maxsize=1)
+def _sentence_splitter() -> Callable[[str], List[str]]:
+    # Resolved once per process: NLTK's punkt model when available, else a regex.
+    try:
+        import nltk
+
+        for resource in ("punkt", "punkt_tab"):
+            try:
+                nltk.data.find(f"tokenizers/{resource}")
+            except LookupError:
+                nltk.download(resource, quiet=True)
+        nltk.tokenize.sent_tokenize("Warm up the model. Once.")
+        return nltk.tokenize.sent_tokenize
+    except Exception:
+        logger.exception("NLTK tokenization unavailable, falling back to punctuation splitting.")
+        return _SENTENCE_END.split
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in _sentence_splitter()(text) if sentence.strip()]
+
+
+@dataclass
+class Chunk:
+    text: str
+    page_number: int
+    last_page_number: int
+    tokens: int
+
+
+class TokenChunker:
+    """
+    Sliding-window chunker over sentence boundaries, measured in model tokens.
+
+    Sentences are tokenized once and pushed through a window. When the next
+    sentence would overflow `chunk_size` tokens, the window is emitted as a
+    chunk and sentences are dropped from its front until at most
+    `chunk_overlap` tokens remain to start the next chunk. Every sentence
+    enters and leaves the window once, so chunking is linear in the text
+    length. Sentences longer than `chunk_size` are cut at token boundaries,
+    so every chunk fits the model's input limit.
+
+    The window is kept across `add` calls until `flush`, so text from
+    consecutive pages can share a chunk.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, model: str = "text-embedding-3-large"):
+        if chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size, both in tokens.")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # None when tiktoken is unavailable: sizes are then counted in words.
+        self.encoding = get_encoding(model)
+        # (sentence, tokens, page_number)
+        self._window: Deque[Tuple[str, int, int]] = deque()
+        self._tokens = 0
+        self._pending = False
+
+    def _count(self, sentences: List[str]) -> List[int]:
+        if self.encoding is None:
+            return [len(sentence.split()) for sentence in sentences]
+        # Sentences are joined with spaces, so they are measured with their leading space.
+        encoded = self.encoding.encode_batch([" " + sentence for sentence in sentences], disallowed_special=())
+        return [len(tokens) for tokens in encoded]
+
+    def _pieces(self, sentence: str) -> Iterator[Tuple[str, int]]:
+        # Cuts a sentence longer than chunk_size into pieces of at most chunk_size tokens.
+        if self.encoding is None:
+            words = sentence.split()
+            for start in range(0, len(words), self.chunk_size):
+                piece = words[start : start + self.chunk_size]
+                yield " ".join(piece), len(piece)
+            return
+        tokens = self.encoding.encode(sentence, disallowed_special=())
+        for start in range(0, len(tokens), self.chunk_size):
+            piece = tokens[start : start + self.chunk_size]
+            yield self.encoding.decode(piece), len(piece)
+
+    def _emit(self) -> Chunk:
+        self._pending = False
+        return Chunk(
+            text=" ".join(sentence for sentence, _, _ in self._window),
+            page_number=self._window[0][2],
+            last_page_number=self._window[-1][2],
+            tokens=self._tokens,
+        )
+
+    def _push(self, sentence: str, tokens: int, page_number: int, chunks: List[Chunk]) -> None:
+        if self._window and self._tokens + tokens > self.chunk_size:
+            if self._pending:
+                chunks.append(self._emit())
+            # Keep at most chunk_overlap tokens, and leave room for the new sentence.
+            while self._window and (
+                self._tokens > self.chunk_overlap or self._tokens + tokens > self.chunk_size
+            ):
+                self._tokens -= self._window.popleft()[1]
+        self._window.append((sentence, tokens, page_number))
+        self._tokens += tokens
+        self._pending = True
+
+    def add(self, text: str, page_number: int) -> List[Chunk]:
+        """Feed the text of one page and return the chunks completed by it."""
+        chunks: List[Chunk] = []
+        sentences = split_sentences(text)
+        for sentence, tokens in zip(sentences, self._count(sentences)):
+            if tokens <= self.chunk_size:
+                self._push(sentence, tokens, page_number, chunks)
+                continue
+            for piece, piece_tokens in self._pieces(sentence):
+                self._push(piece, piece_tokens, page_number, chunks)
+        return chunks
+
+    def flush(self) -> List[Chunk]:
+        """Emit the text still in the window and start over."""
+        chunks = [self._emit()] if self._pending else []
+        self._window.clear()
+        self._tokens = 0
+        return chunks
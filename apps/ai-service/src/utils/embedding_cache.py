@@ -0,0 +1,118 @@
+# src/utils/embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+# Default on-disk budget for cached vectors.
+DEFAULT_MAX_BYTES = 1 << 30
+# Eviction frees space down to this fraction of the budget, so it does not run on every insert.
+EVICTION_TARGET = 0.9
+
+
+def embedding_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of embeddings keyed by (model, hash of the text).
+
+    Vectors are stored in SQLite as float32 blobs. When the stored vectors
+    exceed `max_bytes`, the least recently used entries are evicted. The
+    database runs in WAL mode and is safe to share between threads and
+    processes. Calls block, so async callers should run them in a thread.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key BLOB PRIMARY KEY, vector BLOB NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)")
+        self._conn.commit()
+        self._size = self._stored_bytes()
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Returns the cached embeddings of `texts` as read-only float32 arrays, keyed by text.
+        Missing texts are left out.
+        """
+        keys = {embedding_key(model, text): text for text in texts}
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            items = list(keys.items())
+            # Stay below SQLite's limit on bound parameters.
+            for start in range(0, len(items), 500):
+                batch = dict(items[start : start + 500])
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    list(batch),
+                ).fetchall()
+                for key, vector in rows:
+                    found[batch[key]] = np.frombuffer(vector, dtype=np.float32)
+                if rows:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET accessed = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model: str, items: Iterable[Tuple[str, Union[np.ndarray, List[float]]]]) -> None:
+        """Stores (text, embedding) pairs, evicting the least recently used entries past `max_bytes`."""
+        now = time.time()
+        rows = [
+            (embedding_key(model, text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in items
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+            self._size += sum(len(vector) for _, vector, _ in rows)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Other processes may share the file, so measure before evicting.
+        self._size = self._stored_bytes()
+        excess = self._size - int(self.max_bytes * EVICTION_TARGET)
+        if self._size <= self.max_bytes or excess <= 0:
+            return
+        evicted: List[Tuple[bytes]] = []
+        for key, size in self._conn.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY accessed"):
+            evicted.append((key,))
+            excess -= size
+            self._size -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,47 @@
+# src/utils/growable_array.py
+from typing import Tuple
+
+import numpy as np
+
+
+class GrowableArray:
+    """
+    Append-only NumPy buffer with amortized O(1) appends.
+
+    Rows are stored in a contiguous array whose capacity doubles when full,
+    so appending a batch never copies more than the existing data once per
+    doubling. `view()` returns the populated rows without copying.
+    """
+
+    def __init__(self, row_shape: Tuple[int, ...] = (), dtype=np.float32, capacity: int = 16):
+        self.row_shape = tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        self._data = np.empty((max(capacity, 1),) + self.row_shape, dtype=self.dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= self._data.shape[0]:
+            return
+        new_capacity = max(capacity, self._data.shape[0] * 2)
+        data = np.empty((new_capacity,) + self.row_shape, dtype=self.dtype)
+        data[: self._size] = self._data[: self._size]
+        self._data = data
+
+    def append(self, rows) -> None:
+        """Append one or more rows (an array of shape (n, *row_shape))."""
+        rows = np.asarray(rows, dtype=self.dtype).reshape((-1,) + self.row_shape)
+        end = self._size + rows.shape[0]
+        self._reserve(end)
+        self._data[self._size : end] = rows
+        self._size = end
+
+    def truncate(self, size: int) -> None:
+        """Drop every row at position `size` and beyond."""
+        self._size = min(self._size, max(size, 0))
+
+    def view(self) -> np.ndarray:
+        """Return the populated rows as a view on the underlying buffer."""
+        return self._data[: self._size]
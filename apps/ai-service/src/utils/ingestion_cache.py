@@ -0,0 +1,46 @@
+# src/utils/ingestion_cache.py
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestionCache:
+    """
+    Persistent record of what was ingested for each document: the hash of every
+    page's text together with the vector ids and token count it produced, and
+    the parameters (chunking, embedding model, collection) used at the time.
+
+    Re-ingesting a document only needs to process the pages whose hash or
+    parameters changed. Each document is stored as one JSON file under
+    `directory`, replaced atomically.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, document_id: str) -> str:
+        return os.path.join(self.directory, f"{content_hash(document_id)[:32]}.json")
+
+    def load(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the last ingestion of `document_id` as {"params": ..., "pages": {...}},
+        with pages keyed by page number (as a string), or None if it was never ingested.
+        """
+        try:
+            with open(self._path(document_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, document_id: str, params: str, pages: Dict[str, Dict[str, Any]]) -> None:
+        path = self._path(document_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"document_id": document_id, "params": params, "pages": pages}, f)
+        os.replace(tmp_path, path)
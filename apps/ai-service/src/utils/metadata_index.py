@@ -0,0 +1,88 @@
+# src/utils/metadata_index.py
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.growable_array import GrowableArray
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class MetadataIndex:
+    """
+    Inverted index from metadata (key, value) pairs to the rows holding them.
+
+    Rows are appended in increasing order, so every posting list is a sorted
+    int64 array and a filter resolves to the intersection of a few of them
+    instead of a scan over every row; a single-pair filter returns its
+    posting list without copying. Unhashable values (lists, dicts) are not
+    indexed; filters on them are reported back as unresolved so the caller
+    can check the candidate rows one by one.
+    """
+
+    def __init__(self, exclude_keys: Iterable[str] = ()):
+        """
+        Args:
+            exclude_keys: Keys that are never indexed (e.g. free text), so
+                filters on them fall back to the per-row check.
+        """
+        self.exclude_keys = frozenset(exclude_keys)
+        self._postings: Dict[str, Dict[Hashable, GrowableArray]] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, metadata: List[Dict]) -> None:
+        """Index the metadata of the next `len(metadata)` rows."""
+        # Group the batch by (key, value) so each posting list grows by one append.
+        batch: Dict[Tuple[str, Hashable], List[int]] = {}
+        for row, meta in enumerate(metadata, start=self._size):
+            for key, value in meta.items():
+                if key in self.exclude_keys:
+                    continue
+                try:
+                    batch.setdefault((key, value), []).append(row)
+                except TypeError:
+                    continue
+        for (key, value), rows in batch.items():
+            postings = self._postings.setdefault(key, {})
+            posting = postings.get(value)
+            if posting is None:
+                posting = postings[value] = GrowableArray((), dtype=np.int64, capacity=len(rows))
+            posting.append(rows)
+        self._size += len(metadata)
+
+    def lookup(self, metadata_filter: Dict) -> Tuple[Optional[np.ndarray], Dict[str, Any]]:
+        """
+        Resolve the indexable part of `metadata_filter`.
+
+        Returns:
+            Tuple of (rows, unresolved). `rows` are the sorted rows matching every
+            indexable pair, or None when no pair could be resolved through the
+            index; it may be a read-only view of a posting list. `unresolved`
+            holds the pairs that must still be checked per row.
+        """
+        postings: List[np.ndarray] = []
+        unresolved: Dict[str, Any] = {}
+        for key, value in metadata_filter.items():
+            if key in self.exclude_keys:
+                unresolved[key] = value
+                continue
+            try:
+                posting = self._postings.get(key, {}).get(value)
+            except TypeError:
+                unresolved[key] = value
+                continue
+            postings.append(_EMPTY if posting is None else posting.view())
+        if not postings:
+            return None, unresolved
+
+        # Intersect starting from the most selective posting list.
+        postings.sort(key=len)
+        rows = postings[0]
+        for posting in postings[1:]:
+            if len(rows) == 0:
+                break
+            rows = np.intersect1d(rows, posting, assume_unique=True)
+        return rows, unresolved
@@ -0,0 +1,162 @@
+# src/utils/mmap_store.py
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+# Held with flock by the process writing to a collection.
+LOCK_FILE = "writer.lock"
+
+
+def read_manifest(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(directory: str, manifest: Dict[str, Any]) -> None:
+    """Atomically replace the manifest of `directory`."""
+    path = os.path.join(directory, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def has_manifest(directory: str) -> bool:
+    return os.path.isfile(os.path.join(directory, MANIFEST_FILE))
+
+
+class MmapArray:
+    """
+    Append-only array stored in a raw binary file and read through np.memmap.
+
+    Same interface as GrowableArray. Appends are written to the end of the
+    file, so existing pages are never rewritten and stay shared through the
+    OS page cache between every process that maps the file.
+    """
+
+    def __init__(self, path: str, row_shape: Tuple[int, ...] = (), dtype=np.float32):
+        self.path = path
+        self.row_shape = tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        self._row_bytes = self.dtype.itemsize * int(np.prod(self.row_shape, dtype=np.int64))
+        self._file = open(path, "ab", buffering=0)
+        self._size = os.path.getsize(path) // self._row_bytes
+        self._map = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, rows) -> None:
+        rows = np.ascontiguousarray(rows, dtype=self.dtype).reshape((-1,) + self.row_shape)
+        self._file.write(rows.tobytes())
+        self._size += rows.shape[0]
+
+    def refresh(self) -> bool:
+        """
+        Re-read the length of the file, which another process may have changed.
+        Returns whether it had.
+        """
+        size = os.fstat(self._file.fileno()).st_size // self._row_bytes
+        if size == self._size:
+            return False
+        if size < self._size:
+            self._map = None
+        self._size = size
+        return True
+
+    def truncate(self, size: int) -> None:
+        size = min(self._size, max(size, 0))
+        if size == self._size:
+            return
+        self._file.truncate(size * self._row_bytes)
+        self._size = size
+        self._map = None
+
+    def view(self) -> np.ndarray:
+        if self._size == 0:
+            return np.empty((0,) + self.row_shape, dtype=self.dtype)
+        if self._map is None or self._map.shape[0] < self._size:
+            # Remapping is cheap: pages already in the page cache are reused.
+            self._map = np.memmap(self.path, dtype=self.dtype, mode="r", shape=(self._size,) + self.row_shape)
+        return self._map[: self._size]
+
+    def flush(self) -> None:
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+        self._map = None
+
+
+class JsonlSequence:
+    """
+    Append-only, list-like sequence of JSON values stored one per line.
+
+    A sidecar offsets file (int64, one entry per line boundary) makes random
+    access a single read, so values are only decoded when they are used.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "ab+", buffering=0)
+        self._offsets = MmapArray(f"{path}.offsets", (), dtype=np.int64)
+        if len(self._offsets) == 0:
+            self._offsets.append([0])
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def extend(self, values: Iterable[Any]) -> None:
+        lines = [json.dumps(value, separators=(",", ":")).encode("utf-8") + b"\n" for value in values]
+        if not lines:
+            return
+        offsets = self._offsets.view()
+        ends = offsets[-1] + np.cumsum([len(line) for line in lines], dtype=np.int64)
+        self._file.write(b"".join(lines))
+        self._offsets.append(ends)
+
+    def refresh(self) -> bool:
+        """Re-read the length of the sequence, which another process may have changed."""
+        return self._offsets.refresh()
+
+    def _read(self, start: int, stop: int) -> List[Any]:
+        offsets = self._offsets.view()
+        begin, end = int(offsets[start]), int(offsets[stop])
+        data = os.pread(self._file.fileno(), end - begin, begin)
+        return [json.loads(line) for line in data.splitlines()]
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self._read(start, stop) if start < stop else []
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("JsonlSequence index out of range")
+        return self._read(index, index + 1)[0]
+
+    def __iter__(self) -> Iterator[Any]:
+        # Decode in blocks to keep memory bounded on large sidecars.
+        block = 4096
+        for start in range(0, len(self), block):
+            yield from self._read(start, min(start + block, len(self)))
+
+    def truncate(self, size: int) -> None:
+        size = min(len(self), max(size, 0))
+        self._file.truncate(int(self._offsets.view()[size]))
+        self._offsets.truncate(size + 1)
+
+    def flush(self) -> None:
+        os.fsync(self._file.fileno())
+        self._offsets.flush()
+
+    def close(self) -> None:
+        self._file.close()
+        self._offsets.close()
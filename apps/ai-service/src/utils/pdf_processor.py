@@ -1,13 +1,21 @@
 import asyncio
+import json
 import logging
+import multiprocessing
+import os
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterable, AsyncIterator, Deque, Dict, List, Optional, Protocol, Tuple, TypeVar
 
+import numpy as np
 from pydantic import BaseModel
 
-from src.utils.token_counter import count_tokens
-from src.utils.vector_db import VectorDBInterface
+from src.utils.chunker import Chunk, TokenChunker
+from src.utils.ingestion_cache import IngestionCache, content_hash
+from src.utils.token_counter import count_tokens_batch
+from src.utils.vector_db import TEXT_FIELD, VectorDBInterface
 
 # Stub definitions for types used in processing.
 class PDFPage(BaseModel):
@@ -30,15 +38,126 @@ class ProcessingResult(BaseModel):
     processing_time: float
     vector_ids: List[str]
 
+class Embedder(Protocol):
+    """Anything that embeds a list of texts, such as src.llm.embedding_generator.EmbeddingGenerator."""
+    async def generate(self, texts: List[str], model: str) -> np.ndarray:
+        ...
+
+T = TypeVar("T")
+
+# Worker processes used for PDF text extraction.
+EXTRACTION_WORKERS = os.cpu_count() or 1
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    global _extraction_pool
+    if _extraction_pool is None:
+        # Forking copies a process that runs threads (the event loop's executors,
+        # SDK clients) and can inherit a lock held mid-operation, so workers start
+        # from a clean server process instead.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        _extraction_pool = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=context)
+    return _extraction_pool
+
+def shutdown_extraction_pool() -> None:
+    """Stops the PDF extraction worker processes, cancelling queued extractions. Called on app shutdown."""
+    global _extraction_pool
+    if _extraction_pool is not None:
+        pool, _extraction_pool = _extraction_pool, None
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _count_pages(file_path: str) -> int:
+    from PyPDF2 import PdfReader
+    return len(PdfReader(file_path).pages)
+
+def _extract_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """Extracts the text of pages [start, stop) of a PDF; runs in a worker process."""
+    from PyPDF2 import PdfReader
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+# Marks the end of a stage's output in its queue.
+_END = object()
+
+class _StageError:
+    def __init__(self, error: Exception):
+        self.error = error
+
+async def buffered(source: AsyncIterator[T], maxsize: int) -> AsyncIterator[T]:
+    """
+    Drive `source` in a background task that runs at most `maxsize` items ahead
+    of the consumer, so consecutive pipeline stages overlap while memory stays
+    bounded. Errors raised by `source` are re-raised to the consumer.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    async def produce() -> None:
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(_StageError(e))
+            return
+        await queue.put(_END)
+
+    task = asyncio.create_task(produce())
+    try:
+        while (item := await queue.get()) is not _END:
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        task.cancel()
+
+async def batched(source: AsyncIterable[T], size: int) -> AsyncIterator[List[T]]:
+    """Group the items of `source` into lists of at most `size` items."""
+    batch: List[T] = []
+    async for item in source:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 class PDFProcessor:
-    def __init__(self, vector_db: Optional[VectorDBInterface] = None, vector_size: int = 3):
+    def __init__(
+        self,
+        vector_db: Optional[VectorDBInterface] = None,
+        vector_size: int = 3,
+        cache: Optional[IngestionCache] = None,
+        queue_size: int = 8,
+        batch_size: int = 64,
+        pages_per_task: int = 16,
+        parse_concurrency: int = 8,
+        cross_page_chunks: bool = False,
+        embedder: Optional[Embedder] = None
+    ):
         """
         Initialize PDFProcessor with an optional vector database instance.
         :param vector_db: An instance implementing VectorDBInterface for storing vector embeddings.
         :param vector_size: Dimension of vector embeddings.
+        :param cache: Ingestion cache used to skip unchanged pages when a document is re-ingested.
+        :param queue_size: Items each pipeline stage may run ahead of the next one.
+        :param batch_size: Chunks embedded and written to the vector database together.
+        :param pages_per_task: Pages extracted by each process-pool task.
+        :param parse_concurrency: Maximum number of pages parsed by LlamaParse at once.
+        :param cross_page_chunks: Let chunks run across page boundaries instead of ending with each page.
+        :param embedder: Generates the chunk embeddings, e.g. an EmbeddingGenerator; `vector_size` must
+            match its model. Without one, a deterministic placeholder embedding is used.
         """
         self.vector_db = vector_db
         self.vector_size = vector_size
+        self.cache = cache
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.pages_per_task = pages_per_task
+        self.parse_concurrency = parse_concurrency
+        self.cross_page_chunks = cross_page_chunks
+        self.embedder = embedder
+        self._parser = None
 
     async def process_pdf(
         self,
@@ -48,27 +167,89 @@ class PDFProcessor:
         embedding_model: str = "text-embedding-3-large",
         collection_name: str = "default_collection"
     ) -> ProcessingResult:
+        """
+        Streams the PDF through split -> parse -> chunk -> embed -> store. `chunk_size` and
+        `chunk_overlap` are measured in tokens of `embedding_model`. Stages run
+        concurrently with bounded queues between them, so memory stays constant in
+        the number of pages and chunks are searchable as soon as their batch is
+        stored, while later pages are still being parsed.
+
+        With an ingestion cache, pages whose text and ingestion parameters are unchanged
+        since the last run are skipped entirely. The vectors of every other page are
+        replaced, and pages that no longer exist have their vectors deleted. Chunks that
+        run across pages are stored under their first page, so with `cross_page_chunks`
+        every page is re-processed. The parameters include the collection's uid, so
+        nothing is skipped once the vectors written by the last run are gone (the
+        collection was recreated, or was in memory and the process restarted).
+        """
         start_time = time.time()
+        document_id = Path(file_path).stem
+        collection_uid = ""
+        if self.vector_db:
+            await self._ensure_collection(collection_name)
+            collection_uid = await self.vector_db.collection_uid(collection_name)
+        params = content_hash(json.dumps(
+            [chunk_size, chunk_overlap, embedding_model, collection_name, collection_uid, self.vector_size]
+        ))
+        previous = self.cache.load(document_id) if self.cache else None
+        previous_pages = previous["pages"] if previous else {}
+        reusable = previous_pages if previous and previous["params"] == params else {}
+        if self.cross_page_chunks:
+            reusable = {}
+        # New cache entries, keyed by page number.
+        entries: Dict[str, Dict] = {}
+
+        async def changed_pages(pages: AsyncIterable[PDFPage]) -> AsyncIterator[PDFPage]:
+            async for page in pages:
+                key = str(page.page_number)
+                digest = content_hash(page.text)
+                if key in reusable and reusable[key]["hash"] == digest:
+                    entries[key] = reusable[key]
+                    continue
+                entries[key] = {"hash": digest, "ids": [], "tokens": 0}
+                yield page
+
         # Step 1: PDF Splitting
-        pages = await self.split_pdf(file_path)
+        pages = buffered(changed_pages(self.iter_pages(file_path)), self.queue_size)
         # Step 2: Content Parsing using LlamaParse
-        parsed_contents = await self.parse_content(pages)
+        parsed_contents = buffered(self.iter_parsed(pages), self.queue_size)
         # Step 3: Chunking the parsed content
-        chunks = []
-        for content in parsed_contents:
-            page_chunks = await self.chunk_content(content, chunk_size, chunk_overlap)
-            chunks.extend(page_chunks)
+        chunks = buffered(
+            self.iter_chunks(parsed_contents, chunk_size, chunk_overlap, document_id, embedding_model),
+            self.batch_size
+        )
         # Step 4: Generate vector embeddings and store them in the vector DB if provided.
-        vector_ids = await self.store_vector_embeddings(chunks, embedding_model, collection_name)
-        # Count tokens using the provided token counter.
-        total_tokens = sum(count_tokens(chunk.content, model=embedding_model) for chunk in chunks)
+        embedded = buffered(self.iter_embeddings(batched(chunks, self.batch_size), embedding_model), self.queue_size)
+
+        replaced = set()
+        async for batch, vectors in embedded:
+            # A page's previous vectors are dropped right before its new ones are written.
+            for key in {str(chunk.metadata["page_number"]) for chunk in batch} - replaced:
+                await self._delete_page(collection_name, document_id, key)
+                replaced.add(key)
+            stored_ids = await self._store(batch, vectors, collection_name)
+            # Count tokens using the provided token counter, one encoder call per batch.
+            tokens = count_tokens_batch([chunk.content for chunk in batch], model=embedding_model)
+            for chunk, vector_id, chunk_tokens in zip(batch, stored_ids, tokens):
+                entry = entries[str(chunk.metadata["page_number"])]
+                entry["ids"].append(vector_id)
+                entry["tokens"] += chunk_tokens
+
+        # Pages that changed to produce no chunks, or that were removed from the document.
+        stale = {key for key, entry in entries.items() if entry is not reusable.get(key)}
+        for key in (stale | (previous_pages.keys() - entries.keys())) - replaced:
+            await self._delete_page(collection_name, document_id, key)
+        if self.cache:
+            self.cache.save(document_id, params, entries)
+
+        ordered = [entries[key] for key in sorted(entries, key=int)]
+        vector_ids = [vector_id for entry in ordered for vector_id in entry["ids"]]
         processing_time = time.time() - start_time
-        document_id = Path(file_path).stem
 
         return ProcessingResult(
             document_id=document_id,
-            total_chunks=len(chunks),
-            total_tokens=total_tokens,
+            total_chunks=len(vector_ids),
+            total_tokens=sum(entry["tokens"] for entry in ordered),
             processing_time=processing_time,
             vector_ids=vector_ids
         )
@@ -77,94 +258,162 @@ class PDFProcessor:
         """
         Splits a PDF into pages while preserving page order and handling large or corrupt files.
         """
+        return [page async for page in self.iter_pages(file_path)]
+
+    async def iter_pages(self, file_path: str) -> AsyncIterator[PDFPage]:
+        """
+        Yields the pages of a PDF in order. Text extraction is CPU-bound, so ranges of
+        `pages_per_task` pages are extracted in parallel on a process pool, keeping the
+        event loop free. Up to two ranges per worker are in flight, and each range is
+        yielded as soon as it and every range before it are done.
+        """
+        loop = asyncio.get_running_loop()
+        pool = _get_extraction_pool()
+        pending: Deque[Tuple[int, asyncio.Future]] = deque()
         try:
-            from PyPDF2 import PdfReader
-            reader = PdfReader(file_path)
-            pages = []
-            for i, page in enumerate(reader.pages):
-                text = page.extract_text() or ""
-                pages.append(PDFPage(page_number=i + 1, text=text))
-            return pages
+            total = await loop.run_in_executor(pool, _count_pages, file_path)
+            starts = iter(range(0, total, self.pages_per_task))
+
+            def submit() -> None:
+                start = next(starts, None)
+                if start is not None:
+                    stop = min(start + self.pages_per_task, total)
+                    pending.append((start, loop.run_in_executor(pool, _extract_pages, file_path, start, stop)))
+
+            for _ in range(2 * EXTRACTION_WORKERS):
+                submit()
+            while pending:
+                start, future = pending.popleft()
+                texts = await future
+                submit()
+                for offset, text in enumerate(texts):
+                    yield PDFPage(page_number=start + offset + 1, text=text)
         except Exception as e:
             logging.exception("Failed to split PDF file: %s", file_path)
             raise e
+        finally:
+            for _, future in pending:
+                future.cancel()
 
     async def parse_content(self, pages: List[PDFPage]) -> List[ParsedContent]:
         """
         Parses the content of each PDF page using LlamaParse.
         Extracts tables/lists and maintains formatting. Falls back to raw text on failure.
         """
-        try:
-            from llama_parse import LlamaParse
-        except ImportError as e:
-            logging.error("LlamaParse library not installed. Please install with 'pip install llama-parse'.")
-            raise e
+        return [content async for content in self.iter_parsed(self._iterate(pages))]
 
-        parser = LlamaParse(
-            api_key="YOUR_LLAMA_PARSE_API_KEY",  # Replace with your actual API key or set via env variable.
-            result_type="markdown",
-            verbose=True,
-        )
-        parsed = []
-        for page in pages:
+    @staticmethod
+    async def _iterate(items: List[T]) -> AsyncIterator[T]:
+        for item in items:
+            yield item
+
+    def _get_parser(self):
+        """Returns the LlamaParse client, created on first use and shared by every page."""
+        if self._parser is None:
             try:
-                # Assume the parser processes raw text; adjust if your usage differs.
-                documents = parser.load_data(page.text)
-                content = "\n".join(documents) if isinstance(documents, list) else documents
-            except Exception as e:
-                logging.exception("Error parsing content on page %d", page.page_number)
-                content = page.text  # Fallback to raw page text.
-            parsed.append(ParsedContent(page_number=page.page_number, content=content))
-        return parsed
+                from llama_parse import LlamaParse
+            except ImportError as e:
+                logging.error("LlamaParse library not installed. Please install with 'pip install llama-parse'.")
+                raise e
+
+            self._parser = LlamaParse(
+                api_key="YOUR_LLAMA_PARSE_API_KEY",  # Replace with your actual API key or set via env variable.
+                result_type="markdown",
+                verbose=True,
+            )
+        return self._parser
+
+    async def _parse_page(self, parser, page: PDFPage) -> ParsedContent:
+        try:
+            # Assume the parser processes raw text; adjust if your usage differs.
+            documents = await parser.aload_data(page.text)
+            if isinstance(documents, list):
+                content = "\n".join(getattr(document, "text", document) for document in documents)
+            else:
+                content = documents
+        except Exception as e:
+            logging.exception("Error parsing content on page %d", page.page_number)
+            content = page.text  # Fallback to raw page text.
+        return ParsedContent(page_number=page.page_number, content=content)
+
+    async def iter_parsed(self, pages: AsyncIterable[PDFPage]) -> AsyncIterator[ParsedContent]:
+        """
+        Yields the parsed content of each page in page order. Parsing is network-bound,
+        so up to `parse_concurrency` pages are parsed at once; a page that fails falls
+        back to its raw text on its own, without holding up the other pages.
+        """
+        parser = self._get_parser()
+        pending: Deque[asyncio.Task] = deque()
+        try:
+            async for page in pages:
+                pending.append(asyncio.create_task(self._parse_page(parser, page)))
+                if len(pending) >= self.parse_concurrency:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_chunks(
+        self,
+        contents: AsyncIterable[ParsedContent],
+        chunk_size: int,
+        chunk_overlap: int,
+        document_id: Optional[str] = None,
+        embedding_model: str = "text-embedding-3-large"
+    ) -> AsyncIterator[TextChunk]:
+        """
+        Yields the chunks of the parsed pages in document order, tagged with
+        `document_id` when given. Sizes are measured in tokens of `embedding_model`.
+        With `cross_page_chunks`, the chunking window carries over from one page
+        to the next and chunks keep the number of the page they start on.
+        """
+        chunker = TokenChunker(chunk_size, chunk_overlap, embedding_model)
+        # Chunks started on each page so far.
+        counts: Dict[int, int] = {}
+        async for content in contents:
+            pieces = chunker.add(content.content, content.page_number)
+            if not self.cross_page_chunks:
+                pieces += chunker.flush()
+            for piece in pieces:
+                yield self._text_chunk(piece, counts, document_id)
+        for piece in chunker.flush():
+            yield self._text_chunk(piece, counts, document_id)
+
+    def _text_chunk(self, piece: Chunk, counts: Dict[int, int], document_id: Optional[str]) -> TextChunk:
+        chunk_count = counts.get(piece.page_number, 0)
+        counts[piece.page_number] = chunk_count + 1
+        metadata = {"page_number": piece.page_number, "chunk_order": chunk_count}
+        if piece.last_page_number != piece.page_number:
+            metadata["last_page_number"] = piece.last_page_number
+        chunk_id = f"{piece.page_number}_{chunk_count}"
+        if document_id is not None:
+            metadata["document_id"] = document_id
+            # Chunk ids are unique per collection, not only per document.
+            chunk_id = f"{document_id}:{chunk_id}"
+        return TextChunk(chunk_id=chunk_id, content=piece.text, metadata=metadata)
 
     async def chunk_content(
         self,
         content: ParsedContent,
         chunk_size: int,
-        chunk_overlap: int
+        chunk_overlap: int,
+        embedding_model: str = "text-embedding-3-large"
     ) -> List[TextChunk]:
         """
-        Chunks parsed content into text chunks that respect sentence boundaries,
-        maintain context, and preserve metadata.
+        Chunks parsed content into text chunks of at most `chunk_size` tokens that respect
+        sentence boundaries, overlap by up to `chunk_overlap` tokens, and preserve metadata.
         """
-        try:
-            import nltk
-            nltk.download('punkt', quiet=True)
-            sentences = nltk.tokenize.sent_tokenize(content.content)
-        except Exception as e:
-            logging.exception("NLTK tokenization failed, falling back to whitespace splitting.")
-            sentences = content.content.split(". ")
-
-        chunks = []
-        current_chunk = ""
-        chunk_count = 0
-
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) + 1 <= chunk_size:
-                current_chunk = f"{current_chunk} {sentence}".strip() if current_chunk else sentence
-            else:
-                chunk_id = f"{content.page_number}_{chunk_count}"
-                metadata = {"page_number": content.page_number, "chunk_order": chunk_count}
-                chunks.append(TextChunk(chunk_id=chunk_id, content=current_chunk, metadata=metadata))
-                chunk_count += 1
-
-                if chunk_overlap > 0:
-                    words = current_chunk.split()
-                    overlap_words = words[-chunk_overlap:] if len(words) >= chunk_overlap else words
-                    current_chunk = " ".join(overlap_words) + " " + sentence
-                else:
-                    current_chunk = sentence
-
-        if current_chunk:
-            chunk_id = f"{content.page_number}_{chunk_count}"
-            metadata = {"page_number": content.page_number, "chunk_order": chunk_count}
-            chunks.append(TextChunk(chunk_id=chunk_id, content=current_chunk, metadata=metadata))
-
-        return chunks
+        chunker = TokenChunker(chunk_size, chunk_overlap, embedding_model)
+        counts: Dict[int, int] = {}
+        pieces = chunker.add(content.content, content.page_number) + chunker.flush()
+        return [self._text_chunk(piece, counts, None) for piece in pieces]
 
     def generate_embedding(self, text: str) -> List[float]:
         """
         Dummy embedding generator that returns a fixed-size vector derived from the text.
+        Used when the processor has no embedder.
         """
         if not text:
             return [0.0] * self.vector_size
@@ -172,6 +421,36 @@ class PDFProcessor:
         # Generate a dummy vector; each element is computed from the ascii_sum.
         return [float((ascii_sum / (i + 1)) % 1) for i in range(self.vector_size)]
 
+    async def embed_chunks(self, chunks: List[TextChunk], embedding_model: str) -> np.ndarray:
+        """Generates one vector embedding per chunk."""
+        if self.embedder:
+            return await self.embedder.generate([chunk.content for chunk in chunks], model=embedding_model)
+        return np.asarray([self.generate_embedding(chunk.content) for chunk in chunks], dtype=np.float32)
+
+    async def iter_embeddings(
+        self,
+        batches: AsyncIterable[List[TextChunk]],
+        embedding_model: str
+    ) -> AsyncIterator[Tuple[List[TextChunk], np.ndarray]]:
+        """
+        Yields each batch of chunks together with its embeddings. Run behind `buffered`,
+        the next batches are embedded while the consumer writes the current one.
+        """
+        async for batch in batches:
+            yield batch, await self.embed_chunks(batch, embedding_model)
+
+    async def _delete_page(self, collection_name: str, document_id: str, page_key: str) -> None:
+        if self.vector_db:
+            await self.vector_db.delete_vectors(
+                collection_name, {"document_id": document_id, "page_number": int(page_key)}
+            )
+
+    async def _ensure_collection(self, collection_name: str) -> None:
+        try:
+            await self.vector_db.create_collection(collection_name, self.vector_size)
+        except Exception as e:
+            logging.warning("Collection creation may have already been done: %s", e)
+
     async def store_vector_embeddings(
         self,
         chunks: List[TextChunk],
@@ -180,15 +459,28 @@ class PDFProcessor:
     ) -> List[str]:
         """
         Generates vector embeddings for each chunk and stores them in the vector database if provided.
-        Otherwise, simulates vector storage.
+        Otherwise, simulates vector storage. Chunks are embedded and written in batches of
+        `batch_size`, with batch N+1 being embedded while batch N is written.
         """
         if self.vector_db:
-            try:
-                await self.vector_db.create_collection(collection_name, self.vector_size)
-            except Exception as e:
-                logging.warning("Collection creation may have already been done: %s", e)
-            vectors = [self.generate_embedding(chunk.content) for chunk in chunks]
-            metadata = [chunk.metadata for chunk in chunks]
+            await self._ensure_collection(collection_name)
+        embedded = buffered(
+            self.iter_embeddings(batched(self._iterate(chunks), self.batch_size), embedding_model), self.queue_size
+        )
+        vector_ids = []
+        async for batch, vectors in embedded:
+            vector_ids.extend(await self._store(batch, vectors, collection_name))
+        return vector_ids
+
+    async def _store(
+        self,
+        chunks: List[TextChunk],
+        vectors: np.ndarray,
+        collection_name: str
+    ) -> List[str]:
+        if self.vector_db:
+            # Store the chunk text so it is reachable through keyword and hybrid search.
+            metadata = [{**chunk.metadata, TEXT_FIELD: chunk.content} for chunk in chunks]
             ids = [chunk.chunk_id for chunk in chunks]
             await self.vector_db.add_vectors(collection_name, vectors, metadata, ids)
             return ids
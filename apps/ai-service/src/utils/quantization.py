@@ -0,0 +1,230 @@
+# src/utils/quantization.py
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+# Upper bound on the number of floats materialized at once while encoding or scoring.
+BLOCK_BUDGET = 1 << 24
+# Rows sampled to train a quantizer.
+TRAIN_SAMPLE_SIZE = 65_536
+
+
+def _sample(vectors: np.ndarray, size: int, seed: int) -> np.ndarray:
+    if len(vectors) > size:
+        rng = np.random.default_rng(seed)
+        vectors = vectors[np.sort(rng.choice(len(vectors), size=size, replace=False))]
+    return np.asarray(vectors, dtype=np.float32)
+
+
+class ScalarQuantizer:
+    """
+    8-bit scalar quantizer ("int8").
+
+    Each dimension is mapped linearly onto 256 levels between its low and
+    high percentiles, so a code takes one byte per dimension (4x smaller
+    than float32). Inner products are computed from the codes directly,
+    without reconstructing the vectors.
+    """
+
+    kind = "int8"
+
+    def __init__(self, dimensions: int, seed: int = 0):
+        self.dimensions = dimensions
+        self.code_size = dimensions
+        self.seed = seed
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.trained_size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.offset is not None
+
+    def train(self, vectors: np.ndarray) -> None:
+        """Fit the per-dimension ranges on a sample of `vectors`."""
+        sample = _sample(vectors, TRAIN_SAMPLE_SIZE, self.seed)
+        # Percentiles rather than min/max, so outliers do not waste levels.
+        low, high = np.quantile(sample, [0.001, 0.999], axis=0)
+        self.offset = low.astype(np.float32)
+        self.scale = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+        self.trained_size = len(vectors)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Return the (n, dimensions) uint8 codes of `vectors`."""
+        codes = np.empty((len(vectors), self.code_size), dtype=np.uint8)
+        block = max(1, BLOCK_BUDGET // self.dimensions)
+        for start in range(0, len(vectors), block):
+            rows = np.asarray(vectors[start : start + block], dtype=np.float32)
+            codes[start : start + len(rows)] = np.clip(np.rint((rows - self.offset) / self.scale), 0, 255)
+        return codes
+
+    def inner_products(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """(m, n) approximate inner products of `queries` with the vectors behind `codes`."""
+        # q . x ~= q . offset + (q * scale) . code
+        scaled = (queries * self.scale).astype(np.float32)
+        products = np.empty((len(queries), len(codes)), dtype=np.float32)
+        block = max(1, BLOCK_BUDGET // self.dimensions)
+        for start in range(0, len(codes), block):
+            rows = codes[start : start + block].astype(np.float32)
+            products[:, start : start + len(rows)] = scaled @ rows.T
+        products += (queries @ self.offset)[:, None]
+        return products
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        return {"offset": self.offset, "scale": self.scale}
+
+    def _restore(self, state) -> None:
+        self.offset = state["offset"]
+        self.scale = state["scale"]
+
+
+class ProductQuantizer:
+    """
+    Product quantizer ("pq").
+
+    Vectors are split into sub-vectors of `subvector_size` dimensions and
+    each sub-vector is replaced by the id of its nearest of 256 centroids
+    learned with k-means, so a code takes one byte per sub-vector (32x
+    smaller than float32 with the default 8 dimensions per sub-vector).
+    Inner products are summed from per-query lookup tables (asymmetric
+    distance computation), so queries are never quantized.
+    """
+
+    kind = "pq"
+
+    def __init__(
+        self,
+        dimensions: int,
+        subvector_size: int = 8,
+        kmeans_iterations: int = 10,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            dimensions: Dimensionality of the vectors.
+            subvector_size: Dimensions per sub-vector; vectors are zero-padded
+                to a multiple of it.
+            kmeans_iterations: Lloyd iterations used when training centroids.
+            seed: Seed for sampling and centroid initialization.
+        """
+        self.dimensions = dimensions
+        self.subvector_size = subvector_size
+        self.subvectors = -(-dimensions // subvector_size)
+        self.code_size = self.subvectors
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        # (subvectors, clusters, subvector_size)
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        # (n, dimensions) -> (subvectors, n, subvector_size)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        padding = self.subvectors * self.subvector_size - self.dimensions
+        if padding:
+            vectors = np.pad(vectors, ((0, 0), (0, padding)))
+        return vectors.reshape(len(vectors), self.subvectors, self.subvector_size).transpose(1, 0, 2)
+
+    def _assign(self, parts: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # (subvectors, n) ids of the nearest centroid of every sub-vector.
+        clusters = centroids.shape[1]
+        assignments = np.empty(parts.shape[:2], dtype=np.int64)
+        squared = (centroids ** 2).sum(axis=2)[:, None, :]
+        block = max(1, BLOCK_BUDGET // (self.subvectors * clusters))
+        for start in range(0, parts.shape[1], block):
+            chunk = parts[:, start : start + block]
+            keys = squared - 2.0 * np.matmul(chunk, centroids.transpose(0, 2, 1))
+            assignments[:, start : start + chunk.shape[1]] = keys.argmin(axis=2)
+        return assignments
+
+    def train(self, vectors: np.ndarray) -> None:
+        """Learn the centroids of every sub-space on a sample of `vectors`."""
+        parts = self._split(_sample(vectors, TRAIN_SAMPLE_SIZE, self.seed))
+        size = parts.shape[1]
+        clusters = min(256, size)
+        rng = np.random.default_rng(self.seed)
+        centroids = parts[:, rng.choice(size, size=clusters, replace=False)].copy()
+        # Flattened (sub-space, cluster) ids let one bincount update every sub-space.
+        offsets = (np.arange(self.subvectors) * clusters)[:, None]
+        for _ in range(self.kmeans_iterations):
+            flat = (self._assign(parts, centroids) + offsets).ravel()
+            counts = np.bincount(flat, minlength=self.subvectors * clusters).reshape(self.subvectors, clusters)
+            sums = np.stack(
+                [
+                    np.bincount(flat, weights=parts[:, :, dim].ravel(), minlength=self.subvectors * clusters)
+                    for dim in range(self.subvector_size)
+                ],
+                axis=1,
+            ).reshape(self.subvectors, clusters, self.subvector_size)
+            filled = counts > 0
+            # Empty clusters keep their previous centroid.
+            centroids[filled] = (sums[filled] / counts[filled][:, None]).astype(np.float32)
+        self.centroids = centroids
+        self.trained_size = len(vectors)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Return the (n, subvectors) uint8 codes of `vectors`."""
+        codes = np.empty((len(vectors), self.code_size), dtype=np.uint8)
+        block = max(1, BLOCK_BUDGET // self.dimensions)
+        for start in range(0, len(vectors), block):
+            parts = self._split(vectors[start : start + block])
+            codes[start : start + parts.shape[1]] = self._assign(parts, self.centroids).T
+        return codes
+
+    def inner_products(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """(m, n) approximate inner products of `queries` with the vectors behind `codes`."""
+        clusters = self.centroids.shape[1]
+        # Lookup tables: (m, subvectors * clusters) inner products of each query
+        # sub-vector with every centroid of its sub-space.
+        tables = np.matmul(self._split(queries), self.centroids.transpose(0, 2, 1))
+        tables = tables.transpose(1, 0, 2).reshape(len(queries), -1)
+        offsets = np.arange(self.subvectors, dtype=np.int64) * clusters
+        products = np.empty((len(queries), len(codes)), dtype=np.float32)
+        block = max(1, BLOCK_BUDGET // (self.subvectors * len(queries)))
+        for start in range(0, len(codes), block):
+            lookups = codes[start : start + block].astype(np.int64) + offsets
+            products[:, start : start + len(lookups)] = tables[:, lookups].sum(axis=2)
+        return products
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids}
+
+    def _restore(self, state) -> None:
+        self.centroids = state["centroids"]
+
+
+QUANTIZERS = {quantizer.kind: quantizer for quantizer in (ScalarQuantizer, ProductQuantizer)}
+
+
+def make_quantizer(kind: str, dimensions: int):
+    """Create an untrained quantizer of the given kind ("int8" or "pq")."""
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Unsupported quantization: '{kind}'.")
+    return QUANTIZERS[kind](dimensions)
+
+
+def save_quantizer(quantizer, path: str) -> None:
+    """Write a trained quantizer to an .npz file."""
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(
+        tmp_path,
+        kind=np.asarray(quantizer.kind),
+        dimensions=np.asarray(quantizer.dimensions),
+        trained_size=np.asarray(quantizer.trained_size),
+        **quantizer._state(),
+    )
+    os.replace(tmp_path, path)
+
+
+def load_quantizer(path: str):
+    """Restore a quantizer written by `save_quantizer`."""
+    with np.load(path) as state:
+        quantizer = make_quantizer(str(state["kind"]), int(state["dimensions"]))
+        quantizer.trained_size = int(state["trained_size"])
+        quantizer._restore(state)
+    return quantizer
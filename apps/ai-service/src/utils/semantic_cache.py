@@ -0,0 +1,239 @@
+# src/utils/semantic_cache.py
+import asyncio
+import base64
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.utils.cache import RedisCache
+
+# Entries read from the shared tier per round trip when catching up with other workers.
+PULL_WINDOW = 16
+
+
+class _Namespace:
+    # Fixed-capacity store: row i of `vectors` is the question of `answers[i]`.
+    def __init__(self, dimensions: int, maxsize: int):
+        self.vectors = np.zeros((maxsize, dimensions), dtype=np.float32)
+        self.answers: List[Optional[str]] = [None] * maxsize
+        self.ids: List[Optional[str]] = [None] * maxsize
+        self.created = np.zeros(maxsize)
+        self.used = np.zeros(maxsize)
+        self.count = 0
+        # Entry id -> row, to skip entries already pulled from the shared tier.
+        self.rows: Dict[str, int] = {}
+        # Newest shared entry seen, and when the shared tier was last read.
+        self.last_pulled: Optional[str] = None
+        self.pulled_at = float("-inf")
+
+
+class SemanticCache:
+    """
+    Cache of answers keyed by the embedding of the question they answer.
+
+    A lookup returns the answer of the most similar cached question when its
+    cosine similarity reaches `threshold`, so rephrasings of a question ("can't
+    log in" / "unable to login") share one answer. Entries are partitioned by
+    namespace (e.g. tenant or referer), expire after `ttl` seconds, and each
+    namespace keeps at most `maxsize` entries, replacing the least recently
+    used one when full. A lookup is one matrix-vector product over the
+    namespace's questions.
+
+    With a `shared` Redis tier, `astore` also appends each entry to a Redis
+    list per namespace, and `alookup` pulls the entries other workers added
+    since its last read before reporting a miss, at most once per
+    `refresh_interval` seconds per namespace. Questions are matched locally
+    either way; `lookup` and `store` only use the local tier.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        maxsize: int = 1000,
+        ttl: Optional[int] = 86400,
+        shared: Optional[RedisCache] = None,
+        refresh_interval: float = 5.0,
+    ):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cached question to match
+            maxsize: Maximum number of entries per namespace
+            ttl: Time-to-live in seconds, None means no expiration
+            shared: Optional Redis tier shared between workers
+            refresh_interval: Minimum seconds between reads of the shared tier per namespace
+        """
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self.refresh_interval = refresh_interval
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: Union[np.ndarray, List[float]]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _best(self, space: _Namespace, vector: np.ndarray, now: float) -> Tuple[int, float]:
+        # Most similar live entry as (row, similarity), or (-1, -inf).
+        if space.count == 0:
+            return -1, float("-inf")
+        scores = space.vectors[: space.count] @ vector
+        if self.ttl is not None:
+            scores[now - space.created[: space.count] > self.ttl] = -np.inf
+        row = int(np.argmax(scores))
+        return row, float(scores[row])
+
+    def _match(self, namespace: str, vector: np.ndarray) -> Optional[Tuple[str, float]]:
+        now = time.time()
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            if space is not None and space.vectors.shape[1] == len(vector):
+                row, similarity = self._best(space, vector, now)
+                if similarity >= self.threshold:
+                    space.used[row] = now
+                    return space.answers[row], similarity
+            return None
+
+    def lookup(self, namespace: str, vector: Union[np.ndarray, List[float]]) -> Optional[Tuple[str, float]]:
+        """
+        Returns (answer, similarity) of the closest cached question in `namespace`,
+        or None when none reaches the threshold.
+        """
+        match = self._match(namespace, self._normalize(vector))
+        if match is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return match
+
+    async def alookup(self, namespace: str, vector: Union[np.ndarray, List[float]]) -> Optional[Tuple[str, float]]:
+        """`lookup` that first catches up with the shared tier on a local miss."""
+        vector = self._normalize(vector)
+        match = self._match(namespace, vector)
+        if match is None and self.shared is not None and self._pull_due(namespace):
+            await asyncio.to_thread(self._pull, namespace)
+            match = self._match(namespace, vector)
+            if match is not None:
+                self.shared_hits += 1
+        if match is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return match
+
+    def _insert(self, namespace: str, vector: np.ndarray, answer: str, entry_id: str, created: float) -> None:
+        # Caller holds the lock.
+        space = self._namespaces.get(namespace)
+        if space is None or space.vectors.shape[1] != len(vector):
+            previous, space = space, _Namespace(len(vector), self.maxsize)
+            if previous is not None:
+                space.last_pulled, space.pulled_at = previous.last_pulled, previous.pulled_at
+            self._namespaces[namespace] = space
+        row, similarity = self._best(space, vector, time.time())
+        if similarity < 0.99:
+            # Not a repeat of a cached question: take a free or the least recently used row.
+            if space.count < self.maxsize:
+                row = space.count
+                space.count += 1
+            else:
+                row = int(np.argmin(space.used))
+        space.rows.pop(space.ids[row], None)
+        space.vectors[row] = vector
+        space.answers[row] = answer
+        space.ids[row] = entry_id
+        space.rows[entry_id] = row
+        space.created[row] = space.used[row] = created
+
+    def store(self, namespace: str, vector: Union[np.ndarray, List[float]], answer: str) -> Dict[str, Any]:
+        """Cache `answer` for the question embedded as `vector`. Returns the entry as stored in the shared tier."""
+        vector = self._normalize(vector)
+        entry = {
+            "id": uuid.uuid4().hex,
+            "vector": base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii"),
+            "answer": answer,
+            "created": time.time(),
+        }
+        with self._lock:
+            self._insert(namespace, vector, answer, entry["id"], entry["created"])
+        return entry
+
+    async def astore(self, namespace: str, vector: Union[np.ndarray, List[float]], answer: str) -> None:
+        """`store` that also publishes the entry to the shared tier."""
+        entry = self.store(namespace, vector, answer)
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.push, f"answers:{namespace}", entry, self.maxsize)
+
+    def _pull_due(self, namespace: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            if space is None:
+                space = self._namespaces[namespace] = _Namespace(0, self.maxsize)
+            if now - space.pulled_at < self.refresh_interval:
+                return False
+            space.pulled_at = now
+            return True
+
+    def _pull(self, namespace: str) -> None:
+        # Reads the shared list backwards in growing windows until it reaches the
+        # newest entry seen by the last pull, then adds the unseen entries.
+        key = f"answers:{namespace}"
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            last = space.last_pulled if space is not None else None
+        count = PULL_WINDOW if last is not None else self.maxsize
+        while True:
+            entries = self.shared.tail(key, count)
+            if entries is None:
+                return
+            if len(entries) < count or count >= self.maxsize or any(entry["id"] == last for entry in entries):
+                break
+            count = min(count * 4, self.maxsize)
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            for entry in entries:
+                space = self._namespaces.get(namespace)
+                if space is not None and entry["id"] in space.rows:
+                    continue
+                if self.ttl is not None and now - entry["created"] > self.ttl:
+                    continue
+                vector = np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32)
+                self._insert(namespace, vector, entry["answer"], entry["id"], entry["created"])
+            space = self._namespaces.get(namespace)
+            if space is not None:
+                space.last_pulled = entries[-1]["id"]
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Clear one namespace, or every namespace when None."""
+        with self._lock:
+            if namespace is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(namespace, None)
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        """Get cache statistics."""
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total) * 100 if total > 0 else 0
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "total": total,
+            "hit_rate": hit_rate,
+            "size": sum(space.count for space in self._namespaces.values()),
+            "namespaces": len(self._namespaces),
+        }
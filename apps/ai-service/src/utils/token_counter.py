@@ -1,5 +1,9 @@
 # src/utils/token_counter.py
 import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List
 
 logger = logging.getLogger(__name__)
 
@@ -9,26 +13,90 @@ except ImportError:
     tiktoken = None
     logger.warning("tiktoken library not found. Falling back to basic token counting.")
 
+# Strings up to this many characters are counted through a memoized fast path.
+SHORT_TEXT_LENGTH = 64
+# Seconds before loading an encoding is retried after a failure.
+ENCODING_RETRY_INTERVAL = 60
+
+_encodings: Dict[str, Any] = {}
+_encoding_failures: Dict[str, float] = {}
+_encodings_lock = threading.Lock()
+
+def _load_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def get_encoding(model: str):
+    """
+    Return the tiktoken encoding for `model`, loaded once per model. Unknown models
+    use cl100k_base. Returns None when tiktoken is unavailable or the encoding failed
+    to load (e.g. its files could not be downloaded); a failed load is retried after
+    ENCODING_RETRY_INTERVAL seconds.
+    """
+    encoding = _encodings.get(model)
+    if encoding is not None or not tiktoken:
+        return encoding
+    with _encodings_lock:
+        if model in _encodings:
+            return _encodings[model]
+        failed_at = _encoding_failures.get(model)
+        if failed_at is not None and time.monotonic() - failed_at < ENCODING_RETRY_INTERVAL:
+            return None
+        try:
+            encoding = _encodings[model] = _load_encoding(model)
+        except Exception as e:
+            _encoding_failures[model] = time.monotonic()
+            logger.exception("Failed to load the tiktoken encoding for %s: %s", model, e)
+            return None
+        _encoding_failures.pop(model, None)
+        return encoding
+
+def _fallback_count(text: str) -> int:
+    # Basic whitespace split
+    return len(text.split())
+
+@lru_cache(maxsize=8192)
+def _count_short(text: str, model: str) -> int:
+    # Only called once the encoding is loaded, so fallback counts are never memoized.
+    return len(get_encoding(model).encode_ordinary(text))
+
 def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
     """
     Count tokens in the given text using tiktoken for the specified model.
     Falls back to basic whitespace splitting if tiktoken is unavailable or fails.
 
+    The encoding is loaded once per model. Special tokens are counted as plain
+    text, and short strings, which repeat often (roles, system prompts, labels),
+    are memoized.
+
     :param text: The text for which tokens should be counted.
     :param model: The model name to determine the token encoding (default: "gpt-3.5-turbo").
     :return: The number of tokens.
     """
-    if tiktoken:
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-            tokens = encoding.encode(text)
-            token_count = len(tokens)
-            logger.info("Token count calculated using tiktoken: %d", token_count)
-            return token_count
-        except Exception as e:
-            logger.exception("tiktoken failed with error: %s. Falling back to basic token counting.", e)
-    # Fallback method: basic whitespace split
-    tokens = text.split()
-    token_count = len(tokens)
-    logger.info("Token count calculated using fallback method: %d", token_count)
-    return token_count
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return _fallback_count(text)
+    if len(text) <= SHORT_TEXT_LENGTH:
+        return _count_short(text, model)
+    return len(encoding.encode_ordinary(text))
+
+def count_tokens_batch(texts: List[str], model: str = "gpt-3.5-turbo", num_threads: int = 8) -> List[int]:
+    """
+    Count tokens in each of `texts`, encoding them on `num_threads` threads with
+    tiktoken's batch encoder.
+
+    :param texts: The texts for which tokens should be counted.
+    :param model: The model name to determine the token encoding (default: "gpt-3.5-turbo").
+    :param num_threads: Threads used by tiktoken to encode the batch.
+    :return: The number of tokens of each text, in order.
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        return [_fallback_count(text) for text in texts]
+    if len(texts) == 1:
+        return [count_tokens(texts[0], model)]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts, num_threads=num_threads)]
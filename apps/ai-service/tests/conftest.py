@@ -0,0 +1,85 @@
+# tests/conftest.py
+from typing import Dict, List, Optional
+
+import pytest
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the redis client calls made by RedisCache. Values
+    are stored as bytes like Redis returns them; set `down` to make every call
+    fail as if the server were unreachable.
+    """
+
+    def __init__(self):
+        self.data: Dict[str, object] = {}
+        self.down = False
+        self.calls = 0
+
+    def _call(self) -> None:
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("Redis is unreachable")
+
+    def get(self, name: str) -> Optional[bytes]:
+        self._call()
+        return self.data.get(name)
+
+    def set(self, name: str, value: bytes, ex: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        self._call()
+        if nx and name in self.data:
+            return None
+        self.data[name] = value
+        return True
+
+    def delete(self, name: str) -> int:
+        self._call()
+        return int(self.data.pop(name, None) is not None)
+
+    def incr(self, name: str) -> int:
+        self._call()
+        value = int(self.data.get(name, b"0")) + 1
+        self.data[name] = str(value).encode()
+        return value
+
+    @staticmethod
+    def _range(items: List[bytes], start: int, end: int) -> slice:
+        size = len(items)
+        start = max(size + start, 0) if start < 0 else start
+        end = size + end if end < 0 else end
+        return slice(start, end + 1)
+
+    def rpush(self, name: str, value: bytes) -> int:
+        self._call()
+        items = self.data.setdefault(name, [])
+        items.append(value)
+        return len(items)
+
+    def ltrim(self, name: str, start: int, end: int) -> bool:
+        self._call()
+        items = self.data.get(name, [])
+        self.data[name] = items[self._range(items, start, end)]
+        return True
+
+    def lrange(self, name: str, start: int, end: int) -> List[bytes]:
+        self._call()
+        items = self.data.get(name, [])
+        return items[self._range(items, start, end)]
+
+    def expire(self, name: str, seconds: int) -> bool:
+        self._call()
+        return name in self.data
+
+
+@pytest.fixture
+def fake_redis() -> FakeRedis:
+    return FakeRedis()
+
+
+@pytest.fixture
+def word_tokens(monkeypatch):
+    """Count tokens in words, as without tiktoken, so sizes do not depend on downloaded encodings."""
+    from src.utils import chunker, token_counter
+
+    monkeypatch.setattr(token_counter, "get_encoding", lambda model: None)
+    monkeypatch.setattr(chunker, "get_encoding", lambda model: None)
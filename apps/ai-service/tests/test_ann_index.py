@@ -0,0 +1,75 @@
+# tests/test_ann_index.py
+import numpy as np
+import pytest
+
+from src.utils.ann_index import MIN_NPROBE, IVFIndex
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_10(index: IVFIndex, vectors: np.ndarray, queries: np.ndarray, nprobe=None) -> float:
+    normalized = unit(vectors)
+    found = 0
+    for query in queries:
+        truth = set(np.argsort(-(normalized @ query))[:10].tolist())
+        rows = index.candidates(query, nprobe)
+        top = rows[np.argsort(-(normalized[rows] @ query))[:10]]
+        found += len(truth & set(top.tolist()))
+    return found / (10 * len(queries))
+
+
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+def test_probing_every_cluster_returns_every_row(metric):
+    vectors = np.random.default_rng(0).normal(size=(3000, 8)).astype(np.float32)
+    index = IVFIndex(metric)
+    index.train(vectors)
+    rows = index.candidates(vectors[0], nprobe=len(index.lists))
+    np.testing.assert_array_equal(rows, np.arange(3000))
+
+
+def test_default_nprobe_scales_with_the_clusters():
+    rng = np.random.default_rng(0)
+    small, large = IVFIndex("cosine"), IVFIndex("cosine")
+    small.train(rng.normal(size=(400, 8)))
+    large.train(rng.normal(size=(40_000, 8)))
+    assert small.default_nprobe == MIN_NPROBE
+    assert large.default_nprobe == int(np.ceil(len(large.lists) / 4))
+    assert IVFIndex("cosine", nprobe=3).default_nprobe == 3
+
+
+def test_default_recall_on_unclustered_vectors():
+    # Random vectors have no cluster structure: the worst case for an IVF index.
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(20_000, 32)).astype(np.float32)
+    index = IVFIndex("cosine")
+    index.train(vectors)
+    queries = unit(vectors[rng.choice(len(vectors), 50)] + 0.05 * rng.normal(size=(50, 32)))
+    assert recall_at_10(index, vectors, queries) >= 0.85
+    assert recall_at_10(index, vectors, queries, nprobe=len(index.lists)) == 1.0
+
+
+def test_added_rows_are_searchable():
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(2000, 8)).astype(np.float32)
+    index = IVFIndex("dot")
+    index.train(vectors[:1000])
+    index.add(np.arange(1000, 2000), vectors[1000:])
+    assert index.size == 2000
+    np.testing.assert_array_equal(index.candidates(vectors[0], nprobe=len(index.lists)), np.arange(2000))
+
+
+def test_save_and_load(tmp_path):
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(1500, 8)).astype(np.float32)
+    index = IVFIndex("cosine")
+    index.train(vectors)
+    path = str(tmp_path / "ivf.npz")
+    index.save(path)
+
+    loaded = IVFIndex("cosine")
+    loaded.load(path)
+    assert (loaded.trained_size, loaded.size) == (index.trained_size, index.size)
+    for query in vectors[:5]:
+        np.testing.assert_array_equal(loaded.candidates(query), index.candidates(query))
@@ -0,0 +1,96 @@
+# tests/test_bm25.py
+import math
+
+import numpy as np
+import pytest
+
+from src.utils.bm25 import BM25Index, tokenize
+from src.utils.vector_db import reciprocal_rank_fusion, weighted_fusion
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("Vector-DB, vector db!") == ["vector", "db", "vector", "db"]
+
+
+def test_score_matches_the_okapi_formula():
+    texts = ["apple banana", "apple apple cherry", "banana cherry durian fig"]
+    index = BM25Index(k1=1.5, b=0.75)
+    index.add(texts)
+
+    rows, scores = index.score("apple")
+
+    average_length = sum(len(tokenize(text)) for text in texts) / len(texts)
+    idf = math.log(1.0 + (3 - 2 + 0.5) / (2 + 0.5))
+    expected = []
+    for row in (0, 1):
+        tokens = tokenize(texts[row])
+        freq = tokens.count("apple")
+        norm = 1.5 * (1.0 - 0.75 + 0.75 * len(tokens) / average_length)
+        expected.append(idf * freq * 2.5 / (freq + norm))
+    assert rows.tolist() == [0, 1]
+    np.testing.assert_allclose(scores, expected, rtol=1e-5)
+
+
+def test_rare_terms_outweigh_common_ones():
+    index = BM25Index()
+    index.add(["common rare", "common", "common", "common"])
+    rows, scores = index.score("common rare")
+    assert rows.tolist() == [0, 1, 2, 3]
+    assert scores[0] == scores.max()
+    assert scores[1] == pytest.approx(scores[2])
+
+
+def test_batches_match_a_single_add():
+    texts = [f"term{n % 5} term{n % 3} shared" for n in range(30)]
+    whole = BM25Index()
+    whole.add(texts)
+    split = BM25Index()
+    for start in range(0, 30, 7):
+        split.add(texts[start:start + 7])
+    for query in ("term1", "term2 shared", "missing"):
+        expected, actual = whole.score(query), split.score(query)
+        assert actual[0].tolist() == expected[0].tolist()
+        np.testing.assert_allclose(actual[1], expected[1], rtol=1e-6)
+
+
+def test_removed_rows_stop_counting():
+    index = BM25Index()
+    index.add(["alpha beta", "alpha", "gamma"])
+    before = dict(zip(*index.score("alpha")))
+    index.remove(["alpha"])
+    rows, scores = index.score("alpha")
+    # The caller filters removed rows; the remaining row's idf changes.
+    assert rows.tolist() == [0, 1]
+    assert scores[0] != pytest.approx(before[0])
+
+
+def test_unknown_query_terms_score_nothing():
+    index = BM25Index()
+    index.add(["alpha"])
+    rows, scores = index.score("omega")
+    assert len(rows) == 0 and len(scores) == 0
+
+
+def test_reciprocal_rank_fusion_sums_reciprocal_ranks():
+    fused = reciprocal_rank_fusion([([3, 1, 2], [0.9, 0.8, 0.1]), ([1, 4], [5.0, 1.0])], k=60)
+    assert fused == pytest.approx({
+        3: 1 / 61,
+        1: 1 / 62 + 1 / 61,
+        2: 1 / 63,
+        4: 1 / 62,
+    })
+
+
+def test_weighted_fusion_normalizes_each_ranking():
+    # Distances: lower is better. Keyword scores: higher is better.
+    fused = weighted_fusion(
+        [([0, 1, 2], [0.0, 1.0, 2.0]), ([2, 0], [10.0, 5.0])],
+        weights=[0.25, 0.75],
+        higher_is_better=[False, True],
+    )
+    assert fused == pytest.approx({0: 0.25, 1: 0.125, 2: 0.75})
+
+
+def test_weighted_fusion_with_equal_scores():
+    fused = weighted_fusion([([7, 8], [0.5, 0.5]), ([], [])], weights=[1.0, 1.0], higher_is_better=[True, True])
+    assert fused == {7: 1.0, 8: 1.0}
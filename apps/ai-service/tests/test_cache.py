@@ -0,0 +1,146 @@
+# tests/test_cache.py
+import asyncio
+
+import pytest
+
+from src.utils import cache as cache_module
+from src.utils.cache import LRUCache, RedisCache, TieredCache, _hash_args, lru_model_cache
+
+
+def test_redis_cache_round_trip(fake_redis):
+    redis_cache = RedisCache(fake_redis)
+    value = {"answer": "yes", "sources": [{"page": 1, "score": 0.5}], "done": True, "extra": None}
+    redis_cache.put("k", value)
+    assert redis_cache.get("k") == (True, value)
+    assert redis_cache.get("missing") == (False, None)
+    redis_cache.delete("k")
+    assert redis_cache.get("k") == (False, None)
+    assert redis_cache.get_stats()["hits"] == 1
+
+
+def test_redis_cache_compresses_large_values(fake_redis):
+    redis_cache = RedisCache(fake_redis, compress_threshold=100)
+    redis_cache.put("k", "word " * 1000)
+    stored = fake_redis.data["ai-service:cache:k"]
+    assert stored.startswith(b"z") and len(stored) < 1000
+    assert redis_cache.get("k") == (True, "word " * 1000)
+
+
+@pytest.mark.parametrize("value", [(1, 2), {1: "a"}, {"a": (1,)}, {1, 2}, b"bytes"])
+def test_redis_cache_skips_values_json_would_change(fake_redis, value):
+    redis_cache = RedisCache(fake_redis)
+    redis_cache.put("k", value)
+    assert redis_cache.get("k") == (False, None)
+    assert fake_redis.data == {}
+
+
+def test_tiered_cache_keeps_non_json_values_local(fake_redis):
+    tiered = TieredCache(LRUCache(maxsize=10), RedisCache(fake_redis), namespace="n")
+    tiered.put("k", (1, 2))
+    assert tiered.get("k") == (True, (1, 2))
+    other_worker = TieredCache(LRUCache(maxsize=10), RedisCache(fake_redis), namespace="n")
+    assert other_worker.get("k") == (False, None)
+
+
+def test_tiered_cache_shares_entries_between_workers(fake_redis):
+    first = TieredCache(LRUCache(maxsize=10), RedisCache(fake_redis), namespace="retrieval")
+    second = TieredCache(LRUCache(maxsize=10), RedisCache(fake_redis), namespace="retrieval")
+    asyncio.run(first.aput("k", ["chunk"]))
+    assert second.local.get("k") == (False, None)
+    assert asyncio.run(second.aget_shared("k")) == (True, ["chunk"])
+    # The L2 hit was copied into L1.
+    assert second.local.get("k") == (True, ["chunk"])
+
+
+def test_redis_outage_is_a_miss_and_backs_off(fake_redis):
+    redis_cache = RedisCache(fake_redis, retry_after=60)
+    fake_redis.down = True
+    assert redis_cache.get("k") == (False, None)
+    redis_cache.put("k", 1)
+    assert fake_redis.calls == 1
+    assert redis_cache.get_stats()["errors"] == 1
+
+    fake_redis.down = False
+    redis_cache._retry_at = 0.0
+    redis_cache.put("k", 1)
+    assert redis_cache.get("k") == (True, 1)
+
+
+def test_generation_counter(fake_redis):
+    # Workers share the knowledge base generation through a counter that never expires.
+    first, second = RedisCache(fake_redis, ttl=60), RedisCache(fake_redis, ttl=60)
+    assert second.counter("generation:kb") == 0
+    assert first.incr("generation:kb") == 1
+    assert first.incr("generation:kb") == 2
+    assert second.counter("generation:kb") == 2
+    fake_redis.down = True
+    assert second.counter("generation:kb") is None
+    assert first.incr("generation:kb") is None
+
+
+def test_claim_succeeds_once(fake_redis):
+    first, second = RedisCache(fake_redis), RedisCache(fake_redis)
+    assert first.claim("conversation:1") is True
+    assert second.claim("conversation:1") is False
+    assert second.claim("conversation:2") is True
+    fake_redis.down = True
+    assert first.claim("conversation:3") is None
+
+
+def test_list_push_and_tail(fake_redis):
+    redis_cache = RedisCache(fake_redis)
+    for n in range(10):
+        redis_cache.push("answers", {"n": n}, max_length=4)
+    assert redis_cache.tail("answers", 2) == [{"n": 8}, {"n": 9}]
+    assert redis_cache.tail("answers", 100) == [{"n": n} for n in range(6, 10)]
+    redis_cache.push("answers", ("not", "json"), max_length=4)
+    assert len(fake_redis.data["ai-service:cache:answers"]) == 4
+
+
+def test_lru_cache_byte_budget():
+    lru = LRUCache(maxsize=100, max_bytes=10_000)
+    for n in range(10):
+        lru.put(str(n), "x" * 3000)
+    stats = lru.get_stats()
+    assert stats["size_bytes"] <= 10_000
+    assert stats["evictions"] > 0
+    assert lru.get("9")[0] and not lru.get("0")[0]
+    lru.put("huge", "x" * 20_000)
+    assert lru.get("huge") == (False, None)
+
+
+def test_hash_args_is_canonical():
+    history = [{"role": "user", "content": "a long message " * 40}]
+    assert _hash_args(history, model="m") == _hash_args(history, model="m")
+    assert _hash_args({"a": 1, "b": 2}) == _hash_args({"b": 2, "a": 1})
+    assert _hash_args(["1"]) != _hash_args([1])
+    assert _hash_args("ab", "c") != _hash_args("a", "bc")
+    assert _hash_args(history) != _hash_args([{"role": "user", "content": "another long message " * 40}])
+
+
+def test_string_digest_memo_is_bounded(monkeypatch):
+    monkeypatch.setattr(cache_module, "_DIGEST_MEMO_MAX_BYTES", 64 * 1024)
+    monkeypatch.setattr(cache_module, "_digests", type(cache_module._digests)())
+    monkeypatch.setattr(cache_module, "_digests_bytes", 0)
+    for n in range(100):
+        cache_module._string_digest(f"{n:04d}" * 500)
+    assert cache_module._digests_bytes <= 64 * 1024
+    assert 0 < len(cache_module._digests) < 100
+
+
+def test_lru_model_cache_coalesces_concurrent_calls():
+    calls = []
+
+    @lru_model_cache(maxsize=10)
+    async def complete(prompt: str) -> str:
+        calls.append(prompt)
+        await asyncio.sleep(0.01)
+        return prompt.upper()
+
+    async def scenario():
+        results = await asyncio.gather(*(complete("hi") for _ in range(5)))
+        assert results == ["HI"] * 5
+        assert await complete("hi") == "HI"
+
+    asyncio.run(scenario())
+    assert calls == ["hi"]
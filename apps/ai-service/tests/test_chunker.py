@@ -0,0 +1,89 @@
+# tests/test_chunker.py
+import pytest
+
+from src.utils import chunker
+from src.utils.chunker import TokenChunker, split_sentences
+
+pytestmark = pytest.mark.usefixtures("word_tokens")
+
+
+def sentences(count: int):
+    # Sentence n has 3 + n % 4 words.
+    return [" ".join([f"s{n}"] + ["word"] * (1 + n % 4)) + "." for n in range(count)]
+
+
+def chunk_sentences(chunk):
+    return split_sentences(chunk.text)
+
+
+def test_chunks_fit_and_overlap():
+    splitter = TokenChunker(chunk_size=20, chunk_overlap=6)
+    chunks = splitter.add(" ".join(sentences(40)), 1) + splitter.flush()
+
+    assert all(chunk.tokens == len(chunk.text.split()) <= 20 for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        before, after = chunk_sentences(previous), chunk_sentences(current)
+        # The next chunk starts with the tail of the previous one, at most chunk_overlap tokens of it.
+        shared = [sentence for sentence in after if sentence in before]
+        assert shared == before[len(before) - len(shared):]
+        assert sum(len(sentence.split()) for sentence in shared) <= 6
+        assert len(after) > len(shared)
+    # Every sentence is kept, in order.
+    kept = list(dict.fromkeys(sentence for chunk in chunks for sentence in chunk_sentences(chunk)))
+    assert kept == sentences(40)
+
+
+def test_no_overlap():
+    splitter = TokenChunker(chunk_size=12, chunk_overlap=0)
+    chunks = splitter.add(" ".join(sentences(20)), 1) + splitter.flush()
+    assert [sentence for chunk in chunks for sentence in chunk_sentences(chunk)] == sentences(20)
+
+
+def test_long_sentences_are_cut():
+    splitter = TokenChunker(chunk_size=5, chunk_overlap=2)
+    long_sentence = " ".join(f"w{n}" for n in range(23)) + "."
+    chunks = splitter.add(f"Short one. {long_sentence}", 1) + splitter.flush()
+    assert all(chunk.tokens <= 5 for chunk in chunks)
+    words = " ".join(chunk.text for chunk in chunks).split()
+    assert [word for word in words if word.startswith("w")][0] == "w0"
+    assert "w22." in words
+
+
+def test_window_spans_pages_until_flush():
+    splitter = TokenChunker(chunk_size=12, chunk_overlap=0)
+    assert splitter.add("One two three. Four five six.", 1) == []
+    chunks = splitter.add("Seven eight nine. Ten eleven twelve. Thirteen fourteen.", 2)
+    assert [(chunk.page_number, chunk.last_page_number) for chunk in chunks] == [(1, 2)]
+    rest = splitter.flush()
+    assert [(chunk.text, chunk.page_number, chunk.last_page_number) for chunk in rest] == [
+        ("Thirteen fourteen.", 2, 2)
+    ]
+    assert splitter.flush() == []
+
+
+class CharacterEncoding:
+    """One token per character, like a tiktoken encoding with a tiny vocabulary."""
+
+    def encode(self, text, disallowed_special=()):
+        return [ord(c) for c in text]
+
+    def encode_batch(self, texts, disallowed_special=()):
+        return [self.encode(text) for text in texts]
+
+    def decode(self, tokens):
+        return "".join(map(chr, tokens))
+
+
+def test_sizes_in_model_tokens(monkeypatch):
+    monkeypatch.setattr(chunker, "get_encoding", lambda model: CharacterEncoding())
+    splitter = TokenChunker(chunk_size=16, chunk_overlap=4)
+    chunks = splitter.add("Tiny. A sentence that is far too long to fit.", 1) + splitter.flush()
+    assert all(chunk.tokens <= 16 for chunk in chunks)
+    assert "".join(chunk.text for chunk in chunks[1:]).replace(" ", "") == "Asentencethatisfartoolongtofit."
+
+
+def test_invalid_sizes():
+    with pytest.raises(ValueError):
+        TokenChunker(chunk_size=10, chunk_overlap=10)
+    with pytest.raises(ValueError):
+        TokenChunker(chunk_size=0, chunk_overlap=0)
@@ -0,0 +1,60 @@
+# tests/test_embedding_cache.py
+import numpy as np
+import pytest
+
+from src.utils.embedding_cache import EmbeddingCache
+
+
+def vector(value: float, dimensions: int = 4) -> np.ndarray:
+    return np.full(dimensions, value, dtype=np.float32)
+
+
+def test_round_trip_per_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"))
+    cache.put_many("small", [("alpha", vector(1.0)), ("beta", [2.0, 2.0, 2.0, 2.0])])
+
+    found = cache.get_many("small", ["alpha", "beta", "gamma"])
+    assert set(found) == {"alpha", "beta"}
+    np.testing.assert_array_equal(found["beta"], vector(2.0))
+    assert found["alpha"].dtype == np.float32
+    assert not found["alpha"].flags.writeable
+    # The same text under another model is a different entry.
+    assert cache.get_many("large", ["alpha"]) == {}
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_entries_persist(tmp_path):
+    path = str(tmp_path / "nested" / "embeddings.db")
+    cache = EmbeddingCache(path)
+    cache.put_many("small", [("alpha", vector(1.0))])
+    cache.close()
+    reopened = EmbeddingCache(path)
+    assert len(reopened) == 1
+    np.testing.assert_array_equal(reopened.get_many("small", ["alpha"])["alpha"], vector(1.0))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.utils.embedding_cache.time.time", lambda: now[0])
+    # Room for four 16-byte vectors.
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"), max_bytes=64)
+
+    def put(text: str) -> None:
+        now[0] += 1
+        cache.put_many("small", [(text, vector(1.0))])
+
+    for text in ("a", "b", "c", "d"):
+        put(text)
+    now[0] += 1
+    cache.get_many("small", ["a"])
+    put("e")
+    # Eviction frees space down to 90% of the budget: two entries go, the oldest reads first.
+    assert set(cache.get_many("small", ["a", "b", "c", "d", "e"])) == {"a", "d", "e"}
+
+
+def test_replacing_an_entry(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"))
+    cache.put_many("small", [("alpha", vector(1.0))])
+    cache.put_many("small", [("alpha", vector(3.0))])
+    assert len(cache) == 1
+    np.testing.assert_array_equal(cache.get_many("small", ["alpha"])["alpha"], vector(3.0))
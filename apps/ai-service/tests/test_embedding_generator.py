@@ -0,0 +1,199 @@
+# tests/test_embedding_generator.py
+import asyncio
+import hashlib
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+pytest.importorskip("openai")
+
+from config.model_config import COST_PER_TOKEN, EMBEDDING_DIMENSIONS
+from src.llm import embedding_generator
+from src.llm.embedding_generator import EmbeddingGenerator
+from src.utils.embedding_cache import EmbeddingCache
+from src.utils.rate_limiter import RateLimiter
+
+MODEL = "text-embedding-3-small"
+DIMENSIONS = EMBEDDING_DIMENSIONS[MODEL]
+
+pytestmark = pytest.mark.usefixtures("word_tokens")
+
+
+def embedding(text: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    return np.random.default_rng(seed).normal(size=DIMENSIONS).astype(np.float32)
+
+
+class FakeEmbeddingsClient:
+    """
+    Stands in for OpenAIClient.get_embeddings. Requests finish out of order;
+    `failures` maps a text to the number of times a request containing it fails.
+    """
+
+    def __init__(self):
+        self.requests: List[List[str]] = []
+        self.failures: Dict[str, int] = {}
+        self.active = 0
+        self.peak = 0
+
+    async def get_embeddings(self, texts: List[str], model: str) -> np.ndarray:
+        self.requests.append(list(texts))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.001 * (len(self.requests) % 3))
+            for text in texts:
+                if self.failures.get(text):
+                    self.failures[text] -= 1
+                    raise RuntimeError("rate limited")
+            return np.stack([embedding(text) for text in texts])
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def make_generator(monkeypatch):
+    monkeypatch.setattr(embedding_generator, "OpenAIClient", FakeEmbeddingsClient)
+    monkeypatch.setattr(embedding_generator, "get_encoding", lambda model: None)
+
+    def make(**kwargs) -> EmbeddingGenerator:
+        kwargs.setdefault("rate_limiter", RateLimiter(calls=10_000, period=1.0))
+        kwargs.setdefault("retry_backoff", 0.0)
+        return EmbeddingGenerator(**kwargs)
+
+    return make
+
+
+def test_batches_run_concurrently_and_keep_input_order(make_generator):
+    async def scenario():
+        generator = make_generator(max_concurrency=3)
+        texts = [f"text number {n}" for n in range(50)]
+        embeddings = await generator.generate(texts, MODEL, batch_size=4)
+        np.testing.assert_array_equal(embeddings, np.stack([embedding(text) for text in texts]))
+        assert len(generator.client.requests) == 13
+        assert generator.client.peak == 3
+
+    asyncio.run(scenario())
+
+
+def test_only_the_failed_batch_is_retried(make_generator):
+    async def scenario():
+        generator = make_generator(max_retries=3)
+        generator.client.failures = {"text number 5": 2}
+        texts = [f"text number {n}" for n in range(12)]
+        embeddings = await generator.generate(texts, MODEL, batch_size=4)
+        np.testing.assert_array_equal(embeddings, np.stack([embedding(text) for text in texts]))
+        sent = [request[0] for request in generator.client.requests]
+        assert sorted(sent) == ["text number 0", "text number 4", "text number 4", "text number 4", "text number 8"]
+
+    asyncio.run(scenario())
+
+
+def test_a_batch_failing_for_good_fails_the_call(make_generator):
+    async def scenario():
+        generator = make_generator(max_retries=2)
+        generator.client.failures = {"text number 1": 10}
+        with pytest.raises(RuntimeError, match="rate limited"):
+            await generator.generate([f"text number {n}" for n in range(8)], MODEL, batch_size=2)
+        assert sum("text number 1" in request for request in generator.client.requests) == 3
+
+    asyncio.run(scenario())
+
+
+def test_input_validation(make_generator):
+    async def scenario():
+        generator = make_generator()
+        for texts, model in (([], MODEL), (["a", 1], MODEL), (["a"], "text-embedding-ada-002")):
+            with pytest.raises(ValueError):
+                await generator.generate(texts, model)
+        with pytest.raises(ValueError):
+            make_generator(max_concurrency=0)
+
+    asyncio.run(scenario())
+
+
+def test_dimension_mismatch(make_generator):
+    async def scenario():
+        generator = make_generator(max_retries=0)
+
+        async def short_embeddings(texts, model):
+            return np.zeros((len(texts), DIMENSIONS - 1), dtype=np.float32)
+
+        generator.client.get_embeddings = short_embeddings
+        with pytest.raises(ValueError, match="dimension mismatch"):
+            await generator.generate(["a", "b"], MODEL)
+
+    asyncio.run(scenario())
+
+
+def test_batches_fit_the_token_budget(make_generator):
+    async def scenario():
+        generator = make_generator(max_batch_tokens=20)
+        # Text n has 1 + n % 7 words.
+        texts = [" ".join(["word"] * (n % 7) + [f"t{n}"]) for n in range(40)]
+        embeddings = await generator.generate(texts, MODEL, batch_size=5)
+        np.testing.assert_array_equal(embeddings, np.stack([embedding(text) for text in texts]))
+
+        requests = generator.client.requests
+        assert all(len(request) <= 5 for request in requests)
+        assert all(sum(len(text.split()) for text in request) <= 20 for request in requests)
+        assert [text for request in requests for text in request] == texts
+        # Batches are only cut when the next text would not fit.
+        for request, following in zip(requests, requests[1:]):
+            assert len(request) == 5 or sum(len(text.split()) for text in request + following[:1]) > 20
+
+    asyncio.run(scenario())
+
+
+def test_oversize_texts_are_truncated(make_generator):
+    async def scenario():
+        generator = make_generator()
+        long_text = " ".join(f"w{n}" for n in range(30))
+        await generator.generate(["short text", long_text], MODEL, max_batch_tokens=12)
+        assert generator.client.requests == [["short text"], [" ".join(f"w{n}" for n in range(12))]]
+
+    asyncio.run(scenario())
+
+
+def test_cost_is_tracked_per_token(make_generator):
+    async def scenario():
+        generator = make_generator()
+        await generator.generate(["one two three", "four five"], MODEL)
+        assert generator.total_cost == pytest.approx(5 * COST_PER_TOKEN[MODEL])
+
+    asyncio.run(scenario())
+
+
+def test_cached_texts_are_not_sent_again(make_generator, tmp_path):
+    async def scenario():
+        cache = EmbeddingCache(str(tmp_path / "embeddings.db"))
+        generator = make_generator(cache=cache)
+        texts = ["alpha", "beta", "alpha", "gamma"]
+        first = await generator.generate(texts, MODEL)
+        # Repeated texts within a call are sent once.
+        assert generator.client.requests == [["alpha", "beta", "gamma"]]
+
+        second = await generator.generate(["gamma", "delta", "alpha"], MODEL)
+        assert generator.client.requests[1:] == [["delta"]]
+        np.testing.assert_array_equal(first, np.stack([embedding(text) for text in texts]))
+        np.testing.assert_array_equal(second, np.stack([embedding(text) for text in ("gamma", "delta", "alpha")]))
+
+        # Another generator sharing the file reuses every entry.
+        other = make_generator(cache=EmbeddingCache(str(tmp_path / "embeddings.db")))
+        await other.generate(["beta", "delta"], MODEL)
+        assert other.client.requests == []
+
+    asyncio.run(scenario())
+
+
+def test_embeddings_are_one_float32_matrix(make_generator, tmp_path):
+    async def scenario():
+        for cache in (None, EmbeddingCache(str(tmp_path / "embeddings.db"))):
+            generator = make_generator(cache=cache)
+            embeddings = await generator.generate([f"text {n}" for n in range(7)], MODEL, batch_size=3)
+            assert isinstance(embeddings, np.ndarray)
+            assert embeddings.dtype == np.float32 and embeddings.shape == (7, DIMENSIONS)
+            assert embeddings.flags.c_contiguous
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+# tests/test_metadata_index.py
+import numpy as np
+
+from src.utils.metadata_index import MetadataIndex
+
+
+def test_lookup_intersects_postings():
+    index = MetadataIndex()
+    index.add([{"tenant": n % 3, "lang": "en" if n % 2 else "fr"} for n in range(10)])
+    index.add([{"tenant": 0, "lang": "en"}])
+    rows, unresolved = index.lookup({"tenant": 0, "lang": "en"})
+    assert rows.tolist() == [3, 9, 10] and unresolved == {}
+    assert rows.dtype == np.int64
+    assert index.lookup({"tenant": 7})[0].tolist() == []
+    assert index.lookup({"missing": 1})[0].tolist() == []
+
+
+def test_unindexable_pairs_are_left_to_the_caller():
+    index = MetadataIndex(exclude_keys=("text",))
+    index.add([{"tags": ["a"], "text": "hello", "tenant": 1}])
+    rows, unresolved = index.lookup({"tags": ["a"], "text": "hello"})
+    assert rows is None
+    assert unresolved == {"tags": ["a"], "text": "hello"}
+    rows, unresolved = index.lookup({"tags": ["a"], "tenant": 1})
+    assert rows.tolist() == [0] and unresolved == {"tags": ["a"]}
+
+
+def test_single_pair_lookup_does_not_copy():
+    index = MetadataIndex()
+    index.add([{"tenant": 1}] * 1000)
+    first, _ = index.lookup({"tenant": 1})
+    second, _ = index.lookup({"tenant": 1})
+    assert np.shares_memory(first, second)
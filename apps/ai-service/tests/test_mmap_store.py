@@ -0,0 +1,84 @@
+# tests/test_mmap_store.py
+import numpy as np
+
+from src.utils.mmap_store import JsonlSequence, MmapArray, has_manifest, read_manifest, write_manifest
+
+
+def test_mmap_array_appends_and_reopens(tmp_path):
+    path = str(tmp_path / "vectors.f32")
+    array = MmapArray(path, (3,))
+    array.append(np.arange(6).reshape(2, 3))
+    array.append([[6, 7, 8]])
+    assert len(array) == 3
+    np.testing.assert_array_equal(array.view(), np.arange(9).reshape(3, 3))
+    array.flush()
+    array.close()
+
+    reopened = MmapArray(path, (3,))
+    assert len(reopened) == 3
+    np.testing.assert_array_equal(reopened.view()[2], [6, 7, 8])
+
+
+def test_mmap_array_truncate(tmp_path):
+    array = MmapArray(str(tmp_path / "a.f32"))
+    array.append(np.arange(5))
+    array.view()
+    array.truncate(2)
+    assert len(array) == 2
+    np.testing.assert_array_equal(array.view(), [0, 1])
+    array.append([9])
+    np.testing.assert_array_equal(array.view(), [0, 1, 9])
+
+
+def test_mmap_array_refresh_sees_other_writers(tmp_path):
+    path = str(tmp_path / "a.f32")
+    reader = MmapArray(path)
+    writer = MmapArray(path)
+    assert not reader.refresh()
+
+    writer.append(np.arange(4))
+    assert reader.refresh()
+    np.testing.assert_array_equal(reader.view(), np.arange(4))
+
+    writer.truncate(1)
+    assert reader.refresh()
+    np.testing.assert_array_equal(reader.view(), [0])
+
+
+def test_jsonl_sequence(tmp_path):
+    path = str(tmp_path / "metadata.jsonl")
+    sequence = JsonlSequence(path)
+    values = [{"text": f"row {i}", "page": i} for i in range(10)]
+    sequence.extend(values)
+    sequence.extend([])
+    assert len(sequence) == 10
+    assert sequence[3] == values[3]
+    assert sequence[-1] == values[-1]
+    assert sequence[2:5] == values[2:5]
+    assert sequence[::3] == values[::3]
+    assert list(sequence) == values
+
+    sequence.truncate(4)
+    sequence.extend([{"text": "new"}])
+    sequence.flush()
+    sequence.close()
+
+    reopened = JsonlSequence(path)
+    assert list(reopened) == values[:4] + [{"text": "new"}]
+
+
+def test_jsonl_sequence_refresh(tmp_path):
+    path = str(tmp_path / "ids.jsonl")
+    reader = JsonlSequence(path)
+    writer = JsonlSequence(path)
+    writer.extend(["a", "b"])
+    assert reader.refresh()
+    assert list(reader) == ["a", "b"]
+
+
+def test_manifest(tmp_path):
+    directory = str(tmp_path)
+    assert not has_manifest(directory)
+    write_manifest(directory, {"generation": 2})
+    assert has_manifest(directory)
+    assert read_manifest(directory) == {"generation": 2}
@@ -0,0 +1,45 @@
+# tests/test_openai_client.py
+import asyncio
+import base64
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("openai")
+
+from src.llm.openai_client import OpenAIClient
+
+
+def fake_response(vectors: np.ndarray, order):
+    data = [
+        SimpleNamespace(index=index, embedding=base64.b64encode(vectors[index].astype(np.float32).tobytes()).decode())
+        for index in order
+    ]
+    return SimpleNamespace(data=data)
+
+
+def test_embeddings_are_decoded_into_float32_rows():
+    vectors = np.random.default_rng(0).normal(size=(3, 16)).astype(np.float32)
+    requests = []
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        # Items may come back in any order; their index places them.
+        return fake_response(vectors, [2, 0, 1])
+
+    client = OpenAIClient(api_key="test")
+    client.client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    embeddings = asyncio.run(client.get_embeddings(["a", "b", "c"], "text-embedding-3-small"))
+
+    assert requests[0]["encoding_format"] == "base64"
+    assert embeddings.dtype == np.float32 and embeddings.shape == (3, 16)
+    np.testing.assert_array_equal(embeddings, vectors)
+
+
+def test_incomplete_responses_are_rejected():
+    vectors = np.zeros((2, 4), dtype=np.float32)
+    client = OpenAIClient(api_key="test")
+    client.client = SimpleNamespace(embeddings=SimpleNamespace(create=lambda **kwargs: fake_response(vectors, [0])))
+    with pytest.raises(ValueError):
+        asyncio.run(client.get_embeddings(["a", "b"], "text-embedding-3-small"))
@@ -0,0 +1,388 @@
+# tests/test_pdf_processor.py
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+import pytest
+
+from src.utils import pdf_processor
+from src.utils.ingestion_cache import IngestionCache
+from src.utils.pdf_processor import ParsedContent, PDFPage, PDFProcessor, batched, buffered
+from src.utils.vector_db import DummyVectorDB
+
+pytestmark = pytest.mark.usefixtures("word_tokens")
+
+
+async def collect(source):
+    return [item async for item in source]
+
+
+class FakeParser:
+    """Stands in for LlamaParse: returns each page's text as one document, or fails on request."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls: List[str] = []
+        self.active = 0
+        self.peak = 0
+
+    async def aload_data(self, text: str):
+        self.calls.append(text)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            # Later pages finish first, so ordering is not an accident of timing.
+            await asyncio.sleep(0.01 / (len(self.calls) % 5 + 1))
+            if text in self.fail:
+                raise RuntimeError("parse failed")
+            return [SimpleNamespace(text=text)]
+        finally:
+            self.active -= 1
+
+
+def make_processor(pages: List[str], **kwargs) -> PDFProcessor:
+    """A processor reading `pages` (which may be changed between runs) instead of a PDF file."""
+    processor = PDFProcessor(**kwargs)
+    processor._parser = FakeParser()
+
+    async def iter_pages(file_path: str):
+        for number, text in enumerate(pages, start=1):
+            yield PDFPage(page_number=number, text=text)
+
+    processor.iter_pages = iter_pages
+    return processor
+
+
+def page_text(number: int, sentences: int = 6) -> str:
+    return " ".join(f"Page {number} sentence {n} has six words." for n in range(sentences))
+
+
+def test_buffered_keeps_order_and_bounds_read_ahead():
+    async def scenario():
+        produced = []
+
+        async def source():
+            for n in range(20):
+                produced.append(n)
+                yield n
+
+        consumed = []
+        async for item in buffered(source(), 3):
+            # Queue plus the item being put: at most maxsize + 1 ahead.
+            assert len(produced) - len(consumed) <= 5
+            consumed.append(item)
+            await asyncio.sleep(0)
+        assert consumed == list(range(20))
+
+    asyncio.run(scenario())
+
+
+def test_buffered_reraises_source_errors():
+    async def scenario():
+        async def source():
+            yield 1
+            raise ValueError("bad page")
+
+        seen = []
+        with pytest.raises(ValueError, match="bad page"):
+            async for item in buffered(source(), 2):
+                seen.append(item)
+        assert seen == [1]
+
+    asyncio.run(scenario())
+
+
+def test_buffered_stops_the_producer_when_the_consumer_stops():
+    async def scenario():
+        produced = []
+
+        async def source():
+            for n in range(1000):
+                produced.append(n)
+                yield n
+
+        stream = buffered(source(), 2)
+        assert await stream.__anext__() == 0
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        assert len(produced) < 10
+
+    asyncio.run(scenario())
+
+
+def test_batched():
+    async def scenario():
+        assert await collect(batched(PDFProcessor._iterate(list(range(7))), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+        assert await collect(batched(PDFProcessor._iterate([]), 3)) == []
+
+    asyncio.run(scenario())
+
+
+def test_process_pdf_streams_every_page_into_the_collection():
+    async def scenario():
+        db = DummyVectorDB()
+        processor = make_processor([page_text(n) for n in range(1, 6)], vector_db=db, batch_size=4, queue_size=2)
+        result = await processor.process_pdf("docs/manual.pdf", chunk_size=20, chunk_overlap=6, collection_name="c")
+
+        assert result.document_id == "manual"
+        assert result.total_chunks == len(result.vector_ids) > 5
+        assert len(set(result.vector_ids)) == len(result.vector_ids)
+        assert result.total_tokens > 0
+        stored = await db.keyword_search("c", "sentence", limit=1000)
+        assert sorted(r.id for r in stored) == sorted(result.vector_ids)
+        assert {r.metadata["page_number"] for r in stored} == {1, 2, 3, 4, 5}
+        assert all(r.metadata["document_id"] == "manual" for r in stored)
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def extraction(monkeypatch):
+    """
+    Extract "pages" of a fake 23-page PDF on a thread pool, recording how many
+    ranges are in flight. Earlier ranges take longer, so they finish out of order.
+    """
+    state = SimpleNamespace(in_flight=0, peak=0, fail_at=None)
+    lock = threading.Lock()
+
+    def extract_pages(file_path: str, start: int, stop: int):
+        with lock:
+            state.in_flight += 1
+            state.peak = max(state.peak, state.in_flight)
+        try:
+            time.sleep(0.002 * (23 - start) / 4)
+            if state.fail_at is not None and start <= state.fail_at < stop:
+                raise OSError("corrupt page")
+            return [f"text of page {n + 1}" for n in range(start, stop)]
+        finally:
+            with lock:
+                state.in_flight -= 1
+
+    pool = ThreadPoolExecutor(8)
+    monkeypatch.setattr(pdf_processor, "EXTRACTION_WORKERS", 2)
+    monkeypatch.setattr(pdf_processor, "_get_extraction_pool", lambda: pool)
+    monkeypatch.setattr(pdf_processor, "_count_pages", lambda file_path: 23)
+    monkeypatch.setattr(pdf_processor, "_extract_pages", extract_pages)
+    yield state
+    pool.shutdown()
+
+
+def test_pages_are_extracted_in_parallel_and_yielded_in_order(extraction):
+    async def scenario():
+        pages = await PDFProcessor(pages_per_task=4).split_pdf("doc.pdf")
+        assert [page.page_number for page in pages] == list(range(1, 24))
+        assert [page.text for page in pages] == [f"text of page {n}" for n in range(1, 24)]
+        # Two ranges per worker are kept in flight.
+        assert 1 < extraction.peak <= 4
+
+    asyncio.run(scenario())
+
+
+def test_extraction_errors_reach_the_caller(extraction):
+    async def scenario():
+        extraction.fail_at = 9
+        with pytest.raises(OSError, match="corrupt page"):
+            await PDFProcessor(pages_per_task=4).split_pdf("doc.pdf")
+
+    asyncio.run(scenario())
+
+
+def test_shutdown_extraction_pool(monkeypatch):
+    pool = ThreadPoolExecutor(1)
+    monkeypatch.setattr(pdf_processor, "_extraction_pool", pool)
+    pdf_processor.shutdown_extraction_pool()
+    assert pdf_processor._extraction_pool is None
+    with pytest.raises(RuntimeError):
+        pool.submit(print)
+
+
+def test_pages_are_parsed_concurrently_in_page_order():
+    async def scenario():
+        processor = PDFProcessor(parse_concurrency=3)
+        processor._parser = parser = FakeParser(fail={"page 4"})
+        pages = [PDFPage(page_number=n, text=f"page {n}") for n in range(1, 11)]
+        parsed = await processor.parse_content(pages)
+        assert [content.page_number for content in parsed] == list(range(1, 11))
+        # A failed page falls back to its raw text without failing the others.
+        assert [content.content for content in parsed] == [f"page {n}" for n in range(1, 11)]
+        assert parser.peak == 3
+        # One parser serves every page.
+        assert processor._parser is parser
+        assert sorted(parser.calls) == sorted(page.text for page in pages)
+
+    asyncio.run(scenario())
+
+
+def test_ingestion_cache_round_trip(tmp_path):
+    cache = IngestionCache(str(tmp_path / "ingestion"))
+    assert cache.load("manual") is None
+    pages = {"1": {"hash": "abc", "ids": ["manual:1_0"], "tokens": 12}}
+    cache.save("manual", "params", pages)
+    assert IngestionCache(str(tmp_path / "ingestion")).load("manual") == {
+        "document_id": "manual", "params": "params", "pages": pages
+    }
+
+
+async def stored_pages(db: DummyVectorDB):
+    results = await db.keyword_search("c", "sentence", limit=1000)
+    pages = {}
+    for result in results:
+        pages.setdefault(result.metadata["page_number"], set()).add(result.metadata["text"])
+    return pages
+
+
+def test_reingest_only_processes_changed_pages(tmp_path):
+    async def scenario():
+        db = DummyVectorDB()
+        cache = IngestionCache(str(tmp_path))
+        pages = [page_text(n) for n in range(1, 5)]
+        first = await make_processor(pages, vector_db=db, cache=cache).process_pdf(
+            "manual.pdf", chunk_size=20, chunk_overlap=6, collection_name="c"
+        )
+        before = await stored_pages(db)
+
+        pages[1] = page_text(22)
+        del pages[3]
+        processor = make_processor(pages, vector_db=db, cache=cache)
+        second = await processor.process_pdf("manual.pdf", chunk_size=20, chunk_overlap=6, collection_name="c")
+        assert processor._parser.calls == [page_text(22)]
+
+        after = await stored_pages(db)
+        assert set(after) == {1, 2, 3}
+        assert after[1] == before[1] and after[3] == before[3]
+        assert all("Page 22" in text for text in after[2])
+        assert {r.id for r in await db.keyword_search("c", "sentence", limit=1000)} == set(second.vector_ids)
+        assert set(first.vector_ids) & set(second.vector_ids)
+
+        # The result matches a fresh ingestion of the same pages.
+        fresh = await make_processor(pages, vector_db=DummyVectorDB()).process_pdf(
+            "manual.pdf", chunk_size=20, chunk_overlap=6, collection_name="c"
+        )
+        assert second.vector_ids == fresh.vector_ids
+        assert second.total_tokens == fresh.total_tokens
+
+    asyncio.run(scenario())
+
+
+def test_changed_parameters_or_collection_reprocess_everything(tmp_path):
+    async def scenario():
+        db = DummyVectorDB()
+        cache = IngestionCache(str(tmp_path))
+        pages = [page_text(n) for n in range(1, 4)]
+
+        async def ingest(chunk_size: int) -> List[str]:
+            processor = make_processor(pages, vector_db=db, cache=cache)
+            await processor.process_pdf("manual.pdf", chunk_size=chunk_size, chunk_overlap=6, collection_name="c")
+            return processor._parser.calls
+
+        assert len(await ingest(20)) == 3
+        assert await ingest(20) == []
+        assert len(await ingest(30)) == 3
+        # A recreated collection has a new uid, so the cached pages are not trusted.
+        await db.delete_collection("c")
+        assert len(await ingest(30)) == 3
+        assert set(await stored_pages(db)) == {1, 2, 3}
+
+    asyncio.run(scenario())
+
+
+class FakeEmbedder:
+    """Deterministic embeddings derived from each text; records the batches and when they ran."""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.batches: List[List[str]] = []
+        self.models: List[str] = []
+        self.events: List[str] = []
+
+    def embedding(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        return np.random.default_rng(seed).normal(size=self.dimensions).astype(np.float32)
+
+    async def generate(self, texts: List[str], model: str) -> np.ndarray:
+        self.events.append(f"embed {len(self.batches)}")
+        self.batches.append(texts)
+        self.models.append(model)
+        await asyncio.sleep(0.005)
+        return np.stack([self.embedding(text) for text in texts])
+
+
+def test_chunks_are_embedded_by_the_embedder_in_batches():
+    async def scenario():
+        db = DummyVectorDB()
+        embedder = FakeEmbedder(8)
+        processor = make_processor(
+            [page_text(n) for n in range(1, 7)], vector_db=db, vector_size=8, embedder=embedder, batch_size=3
+        )
+        add_vectors = db.add_vectors
+
+        async def slow_add_vectors(*args, **kwargs):
+            embedder.events.append("store start")
+            await asyncio.sleep(0.02)
+            await add_vectors(*args, **kwargs)
+            embedder.events.append("store end")
+
+        db.add_vectors = slow_add_vectors
+        result = await processor.process_pdf(
+            "manual.pdf", chunk_size=20, chunk_overlap=6, embedding_model="text-embedding-3-small",
+            collection_name="c"
+        )
+
+        assert set(embedder.models) == {"text-embedding-3-small"}
+        assert all(len(batch) <= 3 for batch in embedder.batches)
+        assert sum(map(len, embedder.batches)) == result.total_chunks
+        # The next batch is embedded while the current one is being stored.
+        first_store = embedder.events.index("store start")
+        assert embedder.events.index("embed 1") < embedder.events.index("store end", first_store)
+
+        # Stored vectors are the embedder's: each chunk is its own nearest neighbour.
+        for text in (text for batch in embedder.batches[:3] for text in batch):
+            results = await db.search_vectors("c", embedder.embedding(text).tolist(), 1)
+            assert results[0].metadata["text"] == text
+            assert results[0].score == pytest.approx(1.0)
+
+    asyncio.run(scenario())
+
+
+def test_placeholder_embeddings_without_an_embedder():
+    async def scenario():
+        processor = PDFProcessor(vector_size=5)
+        chunks = await processor.chunk_content(ParsedContent(page_number=1, content=page_text(1)), 20, 6)
+        vectors = await processor.embed_chunks(chunks, "text-embedding-3-large")
+        assert vectors.shape == (len(chunks), 5) and vectors.dtype == np.float32
+        assert processor.generate_embedding("") == [0.0] * 5
+
+    asyncio.run(scenario())
+
+
+def test_store_vector_embeddings_in_batches():
+    async def scenario():
+        db = DummyVectorDB()
+        embedder = FakeEmbedder(8)
+        processor = PDFProcessor(vector_db=db, vector_size=8, embedder=embedder, batch_size=4)
+        chunks = await processor.chunk_content(ParsedContent(page_number=1, content=page_text(1, 30)), 20, 0)
+        ids = await processor.store_vector_embeddings(chunks, "text-embedding-3-large", "c")
+        assert ids == [chunk.chunk_id for chunk in chunks]
+        assert [len(batch) for batch in embedder.batches] == [4] * (len(chunks) // 4) + (
+            [len(chunks) % 4] if len(chunks) % 4 else []
+        )
+
+    asyncio.run(scenario())
+
+
+def test_chunk_ids_are_scoped_by_document():
+    async def scenario():
+        processor = PDFProcessor()
+        pages = [ParsedContent(page_number=1, content="One sentence. Another sentence.")]
+        first = await collect(processor.iter_chunks(PDFProcessor._iterate(pages), 200, 0, "doc-a"))
+        second = await collect(processor.iter_chunks(PDFProcessor._iterate(pages), 200, 0, "doc-b"))
+        assert [chunk.chunk_id for chunk in first] == ["doc-a:1_0"]
+        assert [chunk.chunk_id for chunk in second] == ["doc-b:1_0"]
+        assert first[0].metadata == {"page_number": 1, "chunk_order": 0, "document_id": "doc-a"}
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+# tests/test_quantization.py
+import numpy as np
+import pytest
+
+from src.utils.quantization import ProductQuantizer, ScalarQuantizer, load_quantizer, make_quantizer, save_quantizer
+
+
+def clustered(count: int, dimensions: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(16, dimensions))
+    return (centers[rng.integers(0, 16, count)] + 0.3 * rng.normal(size=(count, dimensions))).astype(np.float32)
+
+
+def test_int8_inner_products_are_close():
+    vectors = clustered(2000, 16)
+    queries = clustered(5, 16, seed=1)
+    quantizer = ScalarQuantizer(16)
+    quantizer.train(vectors)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (2000, 16) and codes.dtype == np.uint8
+
+    exact = queries @ vectors.T
+    approximate = quantizer.inner_products(codes, queries)
+    assert np.abs(approximate - exact).max() < 0.05 * np.abs(exact).max()
+
+
+def test_pq_inner_products_track_exact_ones():
+    vectors = clustered(3000, 32)
+    queries = clustered(5, 32, seed=1)
+    quantizer = ProductQuantizer(32, subvector_size=4)
+    quantizer.train(vectors)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (3000, 8)
+
+    exact = queries @ vectors.T
+    approximate = quantizer.inner_products(codes, queries)
+    for row in range(len(queries)):
+        assert np.corrcoef(exact[row], approximate[row])[0, 1] > 0.95
+
+
+def test_pq_pads_the_last_subvector():
+    vectors = clustered(500, 10)
+    quantizer = ProductQuantizer(10, subvector_size=8)
+    quantizer.train(vectors)
+    assert quantizer.code_size == 2
+    assert quantizer.inner_products(quantizer.encode(vectors), vectors[:3]).shape == (3, 500)
+
+
+@pytest.mark.parametrize("kind", ["int8", "pq"])
+def test_save_and_load(tmp_path, kind):
+    vectors = clustered(1000, 16)
+    quantizer = make_quantizer(kind, 16)
+    quantizer.train(vectors)
+    path = str(tmp_path / "quantizer.npz")
+    save_quantizer(quantizer, path)
+
+    loaded = load_quantizer(path)
+    assert loaded.kind == kind and loaded.trained_size == 1000
+    codes = quantizer.encode(vectors)
+    np.testing.assert_array_equal(loaded.encode(vectors), codes)
+    np.testing.assert_array_equal(loaded.inner_products(codes, vectors[:4]), quantizer.inner_products(codes, vectors[:4]))
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        make_quantizer("int4", 16)
@@ -0,0 +1,97 @@
+# tests/test_semantic_cache.py
+import asyncio
+
+import numpy as np
+
+from src.utils.cache import RedisCache
+from src.utils.semantic_cache import SemanticCache
+
+
+def question(seed: int, dimensions: int = 16) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=dimensions)
+
+
+def test_lookup_matches_close_questions():
+    cache = SemanticCache(threshold=0.9)
+    cache.store("ns", question(0), "answer")
+    assert cache.lookup("ns", question(0) * 3)[0] == "answer"
+    assert cache.lookup("ns", question(0) + 0.05 * question(1))[0] == "answer"
+    assert cache.lookup("ns", question(1)) is None
+    assert cache.lookup("other", question(0)) is None
+    assert cache.get_stats()["hits"] == 2
+
+
+def test_namespace_keeps_most_recently_used():
+    cache = SemanticCache(maxsize=2)
+    cache.store("ns", question(0), "a")
+    cache.store("ns", question(1), "b")
+    cache.lookup("ns", question(0))
+    cache.store("ns", question(2), "c")
+    assert cache.lookup("ns", question(0))[0] == "a"
+    assert cache.lookup("ns", question(1)) is None
+
+
+def test_expired_answers_do_not_match():
+    cache = SemanticCache(ttl=0)
+    cache.store("ns", question(0), "stale")
+    assert cache.lookup("ns", question(0)) is None
+
+
+def test_workers_share_answers_through_redis(fake_redis):
+    first = SemanticCache(shared=RedisCache(fake_redis), refresh_interval=0)
+    second = SemanticCache(shared=RedisCache(fake_redis), refresh_interval=0)
+
+    async def scenario():
+        assert await second.alookup("ns", question(0)) is None
+        await first.astore("ns", question(0), "shared answer")
+        answer, similarity = await second.alookup("ns", question(0))
+        assert answer == "shared answer" and similarity > 0.99
+        assert second.get_stats()["shared_hits"] == 1
+        # Pulled entries are not pulled again.
+        await first.astore("ns", question(1), "second answer")
+        assert (await second.alookup("ns", question(1)))[0] == "second answer"
+        assert second.get_stats()["size"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_pull_catches_up_past_the_window(fake_redis):
+    maxsize = 100
+    first = SemanticCache(shared=RedisCache(fake_redis), maxsize=maxsize, refresh_interval=0)
+    second = SemanticCache(shared=RedisCache(fake_redis), maxsize=maxsize, refresh_interval=0)
+
+    async def scenario():
+        await first.astore("ns", question(0), "first")
+        assert await second.alookup("ns", question(0)) is not None
+        for seed in range(1, 150):
+            await first.astore("ns", question(seed), f"answer {seed}")
+        hits = [await second.alookup("ns", question(seed)) for seed in range(50, 150)]
+        assert all(hit is not None for hit in hits)
+
+    asyncio.run(scenario())
+
+
+def test_shared_tier_is_read_at_most_once_per_interval(fake_redis):
+    first = SemanticCache(shared=RedisCache(fake_redis), refresh_interval=0)
+    second = SemanticCache(shared=RedisCache(fake_redis), refresh_interval=3600)
+
+    async def scenario():
+        assert await second.alookup("ns", question(0)) is None
+        await first.astore("ns", question(0), "late answer")
+        reads = fake_redis.calls
+        assert await second.alookup("ns", question(0)) is None
+        assert fake_redis.calls == reads
+
+    asyncio.run(scenario())
+
+
+def test_redis_outage_falls_back_to_local(fake_redis):
+    cache = SemanticCache(shared=RedisCache(fake_redis), refresh_interval=0)
+    fake_redis.down = True
+
+    async def scenario():
+        await cache.astore("ns", question(0), "local answer")
+        assert (await cache.alookup("ns", question(0)))[0] == "local answer"
+        assert await cache.alookup("ns", question(1)) is None
+
+    asyncio.run(scenario())
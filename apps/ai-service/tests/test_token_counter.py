@@ -0,0 +1,98 @@
+# tests/test_token_counter.py
+import pytest
+
+from src.utils import token_counter
+from src.utils.token_counter import count_tokens, count_tokens_batch, get_encoding
+
+
+class CharacterEncoding:
+    """One token per character; counts the calls made to it."""
+
+    def __init__(self):
+        self.calls = 0
+        self.batches = []
+
+    def encode_ordinary(self, text):
+        self.calls += 1
+        return list(text)
+
+    def encode_ordinary_batch(self, texts, num_threads=8):
+        self.batches.append((list(texts), num_threads))
+        return [list(text) for text in texts]
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Fresh encoding state, with `_load_encoding` recording the models it loads."""
+    loaded = []
+    encoding = CharacterEncoding()
+
+    def load(model):
+        loaded.append(model)
+        return encoding
+
+    monkeypatch.setattr(token_counter, "tiktoken", token_counter.tiktoken or object())
+    monkeypatch.setattr(token_counter, "_encodings", {})
+    monkeypatch.setattr(token_counter, "_encoding_failures", {})
+    monkeypatch.setattr(token_counter, "_load_encoding", load)
+    token_counter._count_short.cache_clear()
+    yield loaded, encoding
+    token_counter._count_short.cache_clear()
+
+
+def test_encoding_is_loaded_once_per_model(loads):
+    loaded, encoding = loads
+    assert get_encoding("gpt-4") is encoding
+    assert get_encoding("gpt-4") is encoding
+    get_encoding("gpt-3.5-turbo")
+    assert loaded == ["gpt-4", "gpt-3.5-turbo"]
+
+
+def test_short_texts_are_memoized(loads):
+    _, encoding = loads
+    assert count_tokens("hello", "gpt-4") == 5
+    assert count_tokens("hello", "gpt-4") == 5
+    assert encoding.calls == 1
+    long_text = "x" * (token_counter.SHORT_TEXT_LENGTH + 1)
+    assert count_tokens(long_text, "gpt-4") == len(long_text)
+    assert count_tokens(long_text, "gpt-4") == len(long_text)
+    assert encoding.calls == 3
+    assert count_tokens("", "gpt-4") == 0
+
+
+def test_batch_counts_in_one_call(loads):
+    _, encoding = loads
+    texts = ["a", "bb", "", "dddd"]
+    assert count_tokens_batch(texts, "gpt-4", num_threads=2) == [1, 2, 0, 4]
+    assert encoding.batches == [(texts, 2)]
+    assert count_tokens_batch(["abc"], "gpt-4") == [3]
+    assert len(encoding.batches) == 1
+
+
+def test_failed_loads_are_retried_after_an_interval(loads, monkeypatch):
+    now = [100.0]
+    attempts = []
+
+    def failing_load(model):
+        attempts.append(model)
+        raise OSError("no network")
+
+    monkeypatch.setattr(token_counter.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(token_counter, "_load_encoding", failing_load)
+    assert get_encoding("gpt-4") is None
+    # Counting falls back to words meanwhile.
+    assert count_tokens("two words", "gpt-4") == 2
+    assert count_tokens_batch(["one", "three more words"], "gpt-4") == [1, 3]
+    assert attempts == ["gpt-4"]
+
+    now[0] += token_counter.ENCODING_RETRY_INTERVAL
+    get_encoding("gpt-4")
+    assert attempts == ["gpt-4", "gpt-4"]
+
+
+def test_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(token_counter, "tiktoken", None)
+    monkeypatch.setattr(token_counter, "_encodings", {})
+    assert get_encoding("gpt-4") is None
+    assert count_tokens("three plain words") == 3
+    assert count_tokens_batch(["a b", "c"]) == [2, 1]
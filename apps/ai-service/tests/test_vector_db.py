@@ -0,0 +1,625 @@
+# tests/test_vector_db.py
+import asyncio
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from src.utils import vector_db
+from src.utils.vector_db import DummyTransaction, DummyVectorDB, VectorDBError, _Collection
+
+DIMENSIONS = 4
+
+
+def rows(start: int, stop: int):
+    # Row n has vector [n, 1, 0, 0] and metadata {"n": n}, so every row can be checked against its metadata.
+    vectors = [[float(n), 1.0, 0.0, 0.0] for n in range(start, stop)]
+    metadata = [{"n": n, "parity": n % 2, "low": n < 6, "text": f"row number {n}"} for n in range(start, stop)]
+    ids = [f"id-{n}" for n in range(start, stop)]
+    return vectors, metadata, ids
+
+
+async def live_ids(db: DummyVectorDB, collection: str = "c"):
+    results = await db.search_vectors(collection, [1.0, 0.0, 0.0, 0.0], limit=10_000)
+    for result in results:
+        assert result.id == f"id-{result.metadata['n']}"
+    return {result.id for result in results}
+
+
+async def filled(db: DummyVectorDB, count: int, collection: str = "c") -> DummyVectorDB:
+    await db.create_collection(collection, DIMENSIONS)
+    await db.add_vectors(collection, *rows(0, count))
+    return db
+
+
+@pytest.fixture(params=["memory", "disk"])
+def make_db(request, tmp_path):
+    storage_dir = str(tmp_path) if request.param == "disk" else None
+    return lambda **kwargs: DummyVectorDB(storage_dir=storage_dir, **kwargs)
+
+
+def test_transaction_rollback(make_db):
+    async def scenario():
+        db = await filled(make_db(), 10)
+        with pytest.raises(RuntimeError):
+            async with DummyTransaction(db):
+                await db.add_vectors("c", *rows(10, 20))
+                await db.delete_vectors("c", {"parity": 0})
+                await db.create_collection("other", DIMENSIONS)
+                raise RuntimeError("ingest failed")
+        assert await live_ids(db) == {f"id-{n}" for n in range(10)}
+        assert len(db.collections["c"]) == 10
+        assert "other" not in db.collections
+        # The collection takes writes again after the rollback.
+        await db.add_vectors("c", *rows(10, 12))
+        assert len(await live_ids(db)) == 12
+
+    asyncio.run(scenario())
+
+
+def test_transaction_commit(make_db):
+    async def scenario():
+        db = await filled(make_db(), 10)
+        async with DummyTransaction(db):
+            await db.add_vectors("c", *rows(10, 14))
+            # Deletes also match rows added earlier in the transaction.
+            await db.delete_vectors("c", {"parity": 1})
+        assert await live_ids(db) == {f"id-{n}" for n in range(14) if n % 2 == 0}
+
+    asyncio.run(scenario())
+
+
+def test_delete_matches_rows_added_in_the_transaction(make_db):
+    async def scenario():
+        db = await filled(make_db(), 4)
+        async with DummyTransaction(db):
+            await db.add_vectors("c", [[0.0, 1.0, 0.0, 0.0]], [{"k": "new"}], ["b"])
+            await db.add_vectors("c", [[0.0, 0.0, 1.0, 0.0]], [{"k": "kept"}], ["c"])
+            await db.delete_vectors("c", {"k": "new"})
+        results = await db.search_vectors("c", [0.0, 1.0, 0.0, 0.0], limit=10)
+        assert {r.id for r in results} == {"id-0", "id-1", "id-2", "id-3", "c"}
+
+        # An empty filter deletes the transaction's rows too.
+        async with DummyTransaction(db):
+            await db.add_vectors("c", *rows(10, 12))
+            await db.delete_vectors("c", {})
+        assert await db.search_vectors("c", [1.0, 0.0, 0.0, 0.0], limit=10) == []
+
+    asyncio.run(scenario())
+
+
+def test_readers_see_last_commit_during_transaction(make_db):
+    async def scenario():
+        db = await filled(make_db(), 10)
+        committed = await live_ids(db)
+        async with DummyTransaction(db):
+            await db.add_vectors("c", *rows(10, 20))
+            await db.delete_vectors("c", {"parity": 0})
+            assert await live_ids(db) == committed
+            assert await db.keyword_search("c", "number") != []
+            assert len(await db.search_vectors("c", [1.0, 0, 0, 0], 100, {"parity": 0})) == 5
+        assert await live_ids(db) == {f"id-{n}" for n in range(20) if n % 2 == 1}
+
+    asyncio.run(scenario())
+
+
+def test_snapshot_survives_later_commits(make_db):
+    async def scenario():
+        db = await filled(make_db(), 10)
+        coll = db.collections["c"]
+        snapshot = coll.snapshot()
+        await db.add_vectors("c", *rows(10, 15))
+        await db.delete_vectors("c", {"n": 3})
+        assert snapshot.size == 10
+        assert snapshot.live_rows(np.arange(10)).tolist() == list(range(10))
+        assert coll.snapshot().size == 15
+
+    asyncio.run(scenario())
+
+
+def test_writes_outside_transaction_wait_for_it(make_db):
+    async def scenario():
+        db = await filled(make_db(), 2)
+
+        async def outside():
+            await asyncio.sleep(0.005)
+            await db.add_vectors("c", *rows(2, 3))
+
+        # Created before the transaction, so the task does not inherit it.
+        task = asyncio.create_task(outside())
+        async with DummyTransaction(db):
+            await asyncio.sleep(0.05)
+            assert not task.done()
+        await task
+        assert len(await live_ids(db)) == 3
+
+    asyncio.run(scenario())
+
+
+def test_nested_transactions_are_rejected(make_db):
+    async def scenario():
+        db = await filled(make_db(), 1)
+        async with DummyTransaction(db):
+            with pytest.raises(Exception, match="nested"):
+                async with DummyTransaction(db):
+                    pass
+
+    asyncio.run(scenario())
+
+
+def test_reopen_keeps_rows_and_deletes(tmp_path):
+    async def scenario():
+        db = await filled(DummyVectorDB(storage_dir=str(tmp_path)), 10)
+        await db.delete_vectors("c", {"n": 4})
+        uid = await db.collection_uid("c")
+        await db.close()
+
+        reopened = DummyVectorDB(storage_dir=str(tmp_path))
+        assert await live_ids(reopened) == {f"id-{n}" for n in range(10) if n != 4}
+        assert await reopened.collection_uid("c") == uid
+        assert [r.id for r in await reopened.keyword_search("c", "number 7", limit=1)] == ["id-7"]
+
+        await reopened.delete_collection("c")
+        await reopened.create_collection("c", DIMENSIONS)
+        assert await reopened.collection_uid("c") != uid
+
+    asyncio.run(scenario())
+
+
+def test_interrupted_transaction_is_discarded(tmp_path):
+    async def scenario():
+        db = await filled(DummyVectorDB(storage_dir=str(tmp_path)), 10)
+        # A writer that dies mid-transaction: rows and deletes reach disk, the commit never does.
+        coll = db.collections["c"]
+        coll.begin(checkpoint=True)
+        vectors, metadata, ids = rows(10, 15)
+        coll.append(np.asarray(vectors, dtype=np.float32), metadata, ids)
+        coll.delete(np.arange(3))
+        coll.flush()
+        coll._unlock()
+
+        reopened = DummyVectorDB(storage_dir=str(tmp_path))
+        assert await live_ids(reopened) == {f"id-{n}" for n in range(10)}
+        # The next writer truncates the leftovers before appending.
+        await reopened.add_vectors("c", *rows(20, 21))
+        assert len(reopened.collections["c"]) == 11
+
+        fresh = DummyVectorDB(storage_dir=str(tmp_path))
+        assert await live_ids(fresh) == {f"id-{n}" for n in range(10)} | {"id-20"}
+
+    asyncio.run(scenario())
+
+
+def test_compaction_drops_deleted_rows(make_db):
+    async def scenario():
+        db = await filled(make_db(), 10)
+        coll = db.collections["c"]
+        # Deleted rows outnumbering live ones trigger a compaction on commit.
+        await db.delete_vectors("c", {"low": True})
+        assert len(coll) == 4 and coll.live_count == 4
+        assert await live_ids(db) == {f"id-{n}" for n in range(6, 10)}
+        assert [r.id for r in await db.search_vectors("c", [1.0, 0, 0, 0], 10, {"parity": 0})] != []
+        await db.add_vectors("c", *rows(10, 12))
+        assert await live_ids(db) == {f"id-{n}" for n in range(6, 12)}
+
+    asyncio.run(scenario())
+
+
+def test_compaction_replaces_generation_files(tmp_path):
+    async def scenario():
+        db = await filled(DummyVectorDB(storage_dir=str(tmp_path)), 10)
+        generation = db.collections["c"].generation
+        await db.delete_vectors("c", {"parity": 0})
+        await db.delete_vectors("c", {"n": 1})
+        assert db.collections["c"].generation == generation + 1
+        files = os.listdir(tmp_path / "c")
+        assert not [name for name in files if name.startswith(f"{generation}.")]
+
+        reopened = DummyVectorDB(storage_dir=str(tmp_path))
+        assert await live_ids(reopened) == {"id-3", "id-5", "id-7", "id-9"}
+
+    asyncio.run(scenario())
+
+
+def test_crash_during_compaction_keeps_previous_generation(tmp_path, monkeypatch):
+    async def scenario():
+        db = await filled(DummyVectorDB(storage_dir=str(tmp_path)), 10)
+        write_manifest = _Collection._write_manifest
+
+        def crash(self, checkpoint=None):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(_Collection, "_write_manifest", crash)
+        with pytest.raises(OSError):
+            await db.delete_vectors("c", {"low": True})
+        monkeypatch.setattr(_Collection, "_write_manifest", write_manifest)
+
+        reopened = DummyVectorDB(storage_dir=str(tmp_path))
+        assert await live_ids(reopened) == {f"id-{n}" for n in range(6, 10)}
+        # The next compaction clears the files the crashed one left behind.
+        await reopened.delete_vectors("c", {"n": 6})
+        await reopened.delete_vectors("c", {"n": 7})
+        await reopened.delete_vectors("c", {"n": 8})
+        assert await live_ids(DummyVectorDB(storage_dir=str(tmp_path))) == {"id-9"}
+
+    asyncio.run(scenario())
+
+
+def test_writers_in_two_processes_are_serialized(tmp_path):
+    # Each DummyVectorDB opens its own lock file, as a second worker process would.
+    asyncio.run(filled(DummyVectorDB(storage_dir=str(tmp_path)), 0))
+    batches = 60
+
+    def writer(offset: int):
+        async def write():
+            db = DummyVectorDB(storage_dir=str(tmp_path))
+            for batch in range(batches):
+                start = offset + batch * 5
+                await db.add_vectors("c", *rows(start, start + 5))
+
+        asyncio.run(write())
+
+    threads = [threading.Thread(target=writer, args=(offset,)) for offset in (0, 1000)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = {f"id-{offset + n}" for offset in (0, 1000) for n in range(batches * 5)}
+    db = DummyVectorDB(storage_dir=str(tmp_path))
+    assert asyncio.run(live_ids(db)) == expected
+    assert len(db.collections["c"]) == len(expected)
+
+
+def test_background_training_keeps_results_exact(make_db):
+    async def scenario():
+        db = make_db(ann_threshold=500, quantization="int8")
+        await db.create_collection("c", DIMENSIONS)
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(2000, DIMENSIONS))
+        await db.add_vectors("c", vectors, [{"n": n} for n in range(2000)], [f"id-{n}" for n in range(2000)])
+        query = vectors[7]
+        before = [r.id for r in await db.search_vectors("c", query.tolist(), 5)]
+        await db.wait_for_training("c")
+        coll = db.collections["c"]
+        assert coll.ann is not None and coll.ann.is_trained
+        assert [r.id for r in await db.search_vectors("c", query.tolist(), 5, nprobe=len(coll.ann.lists))][0] == "id-7"
+        assert before[0] == "id-7"
+
+    asyncio.run(scenario())
+
+
+def test_compaction_keeps_the_trained_index_and_quantizer(make_db, monkeypatch):
+    monkeypatch.setattr(vector_db, "QUANTIZATION_THRESHOLD", 500)
+
+    async def scenario():
+        db = make_db(ann_threshold=500, quantization="int8")
+        await db.create_collection("c", DIMENSIONS)
+        vectors = np.random.default_rng(0).normal(size=(2000, DIMENSIONS))
+        metadata = [{"n": n, "low": n < 1500} for n in range(2000)]
+        await db.add_vectors("c", vectors, metadata, [f"id-{n}" for n in range(2000)])
+        await db.wait_for_training("c")
+        coll = db.collections["c"]
+        centroids, quantizer = coll.ann.centroids, coll.quantizer
+        assert quantizer is not None
+
+        await db.delete_vectors("c", {"low": True})
+        assert len(coll) == 500
+        assert coll.ann.centroids is centroids and coll.ann.size == 500
+        assert coll.quantizer is quantizer and len(coll.codes) == 500
+        assert coll.training is None
+        live = vectors[1500:]
+        for query in live[:5]:
+            results = await db.search_vectors("c", query.tolist(), 10, nprobe=len(coll.ann.lists))
+            assert [r.id for r in results] == [f"id-{int(i[3:]) + 1500}" for i in brute_force(live, query, 10)]
+
+    asyncio.run(scenario())
+
+
+def test_searches_are_served_during_compaction(make_db, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    compaction = _Collection.compaction
+
+    def blocking(self):
+        build = compaction(self)
+
+        def wait_then_build():
+            started.set()
+            release.wait(10)
+            return build()
+
+        return wait_then_build
+
+    monkeypatch.setattr(_Collection, "compaction", blocking)
+
+    async def scenario():
+        db = await filled(make_db(), 10)
+        deleting = asyncio.ensure_future(db.delete_vectors("c", {"low": True}))
+        await asyncio.to_thread(started.wait, 10)
+        # The delete is committed; only the swap to compacted storage is pending.
+        assert await live_ids(db) == {f"id-{n}" for n in range(6, 10)}
+        assert len(db.collections["c"]) == 10
+        release.set()
+        await deleting
+        assert len(db.collections["c"]) == 4
+        assert await live_ids(db) == {f"id-{n}" for n in range(6, 10)}
+
+    asyncio.run(scenario())
+
+
+def brute_force(vectors: np.ndarray, query: np.ndarray, limit: int):
+    scores = (vectors @ query) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    return [f"id-{n}" for n in np.argsort(-scores, kind="stable")[:limit]]
+
+
+def test_ann_only_past_the_threshold(make_db):
+    async def scenario():
+        db = make_db(ann_threshold=1000)
+        await db.create_collection("c", 8)
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(1500, 8)).astype(np.float32)
+        await db.add_vectors("c", vectors[:900], [{"n": n} for n in range(900)], [f"id-{n}" for n in range(900)])
+        await db.wait_for_training("c")
+        coll = db.collections["c"]
+        # Below the threshold no index is trained and every search is exact.
+        assert not coll.ann.is_trained
+        for query in vectors[:5]:
+            results = await db.search_vectors("c", query.tolist(), 10)
+            assert [r.id for r in results] == brute_force(vectors[:900], query, 10)
+
+        await db.add_vectors(
+            "c", vectors[900:], [{"n": n} for n in range(900, 1500)], [f"id-{n}" for n in range(900, 1500)]
+        )
+        await db.wait_for_training("c")
+        assert coll.ann.is_trained
+        for query in vectors[:5]:
+            results = await db.search_vectors("c", query.tolist(), 10, nprobe=len(coll.ann.lists))
+            assert [r.id for r in results] == brute_force(vectors, query, 10)
+
+    asyncio.run(scenario())
+
+
+def test_filters_match_a_per_row_check(make_db):
+    async def scenario():
+        db = make_db()
+        await db.create_collection("c", DIMENSIONS)
+        metadata = [
+            {"tenant": n % 3, "tags": ["x"] if n % 4 == 0 else ["y"], "flag": n % 5 == 0, "text": f"t{n % 2}"}
+            for n in range(60)
+        ]
+        vectors = np.random.default_rng(0).normal(size=(60, DIMENSIONS))
+        await db.add_vectors("c", vectors, metadata, [f"id-{n}" for n in range(60)])
+        await db.delete_vectors("c", {"tenant": 2, "flag": True})
+        deleted = {n for n in range(60) if n % 3 == 2 and n % 5 == 0}
+
+        for metadata_filter in (
+            {"tenant": 1},
+            {"tenant": 0, "flag": True},
+            {"tags": ["x"]},
+            {"tenant": 2, "tags": ["y"]},
+            {"text": "t1", "tenant": 2},
+            {"tenant": 9},
+            {"unknown": 1},
+        ):
+            expected = {
+                f"id-{n}" for n, meta in enumerate(metadata)
+                if n not in deleted and all(meta.get(key) == value for key, value in metadata_filter.items())
+            }
+            results = await db.search_vectors("c", vectors[0].tolist(), 100, metadata_filter)
+            assert {r.id for r in results} == expected, metadata_filter
+
+    asyncio.run(scenario())
+
+
+def test_hybrid_search_keeps_rows_with_the_same_id(make_db):
+    async def scenario():
+        db = make_db()
+        await db.create_collection("c", DIMENSIONS)
+        await db.add_vectors(
+            "c",
+            [[1.0, 0.0, 0.0, 0.0], [0.9, 0.1, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]],
+            [
+                {"document_id": "a", "text": "shared words"},
+                {"document_id": "b", "text": "shared words"},
+                {"document_id": "c", "text": "other"},
+            ],
+            ["1_0", "1_0", "1_1"],
+        )
+        for fusion in ("rrf", "weighted"):
+            results = await db.hybrid_search("c", "shared", [1.0, 0.0, 0.0, 0.0], limit=3, fusion=fusion)
+            assert [(r.id, r.metadata["document_id"]) for r in results[:2]] == [("1_0", "a"), ("1_0", "b")]
+
+    asyncio.run(scenario())
+
+
+def exact_scores(vectors: np.ndarray, query: np.ndarray, metric: str) -> np.ndarray:
+    if metric == "dot":
+        return vectors @ query
+    if metric == "cosine":
+        return (vectors @ query) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    return np.linalg.norm(vectors - query, axis=1)
+
+
+@pytest.mark.parametrize("metric", ["cosine", "dot", "euclidean"])
+def test_search_matches_exact_scores(make_db, metric):
+    async def scenario():
+        db = make_db()
+        await db.create_collection("c", 8, metric)
+        rng = np.random.default_rng(1)
+        vectors = rng.normal(size=(300, 8)).astype(np.float32)
+        await db.add_vectors("c", vectors, [{"n": n} for n in range(300)], [f"id-{n}" for n in range(300)])
+        for query in rng.normal(size=(5, 8)).astype(np.float32):
+            scores = exact_scores(vectors, query, metric)
+            order = np.argsort(scores if metric == "euclidean" else -scores, kind="stable")[:10]
+            results = await db.search_vectors("c", query.tolist(), 10)
+            assert [r.id for r in results] == [f"id-{n}" for n in order]
+            np.testing.assert_allclose([r.score for r in results], scores[order], rtol=1e-4, atol=1e-5)
+
+            # Thresholds are a minimum similarity or a maximum distance.
+            threshold = float(scores[order[4]] + scores[order[5]]) / 2
+            results = await db.search_vectors("c", query.tolist(), 10, score_threshold=threshold)
+            assert [r.id for r in results] == [f"id-{n}" for n in order[:5]]
+
+    asyncio.run(scenario())
+
+
+def test_metric_aliases_and_validation():
+    async def scenario():
+        db = DummyVectorDB()
+        await db.create_collection("l2", DIMENSIONS, "L2")
+        await db.create_collection("ip", DIMENSIONS, "inner_product")
+        assert db.collections["l2"].distance_metric == "euclidean"
+        assert db.collections["ip"].distance_metric == "dot"
+        with pytest.raises(VectorDBError):
+            await db.create_collection("bad", DIMENSIONS, "manhattan")
+        with pytest.raises(VectorDBError):
+            await db.search_vectors("l2", [1.0, 0.0], 1)
+
+    asyncio.run(scenario())
+
+
+def test_cosine_with_a_zero_vector():
+    async def scenario():
+        db = DummyVectorDB()
+        await db.create_collection("c", DIMENSIONS)
+        await db.add_vectors("c", [[0.0] * DIMENSIONS, [1.0, 0.0, 0.0, 0.0]], [{}, {}], ["zero", "unit"])
+        results = await db.search_vectors("c", [1.0, 0.0, 0.0, 0.0], 2)
+        assert [(r.id, r.score) for r in results] == [("unit", pytest.approx(1.0)), ("zero", 0.0)]
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("metric", ["cosine", "dot", "euclidean"])
+def test_batch_search_matches_single_searches(make_db, monkeypatch, metric):
+    # Score the queries a few at a time, as a large collection would.
+    monkeypatch.setattr(vector_db, "BATCH_SCORE_BUDGET", 1000)
+
+    async def scenario():
+        db = make_db()
+        await db.create_collection("c", 8, metric)
+        rng = np.random.default_rng(2)
+        vectors = rng.normal(size=(400, 8)).astype(np.float32)
+        await db.add_vectors(
+            "c", vectors, [{"n": n, "parity": n % 2} for n in range(400)], [f"id-{n}" for n in range(400)]
+        )
+        await db.delete_vectors("c", {"n": 3})
+        queries = rng.normal(size=(13, 8)).astype(np.float32).tolist()
+        for metadata_filter in (None, {"parity": 1}):
+            batched = await db.search_vectors_batch("c", queries, 7, metadata_filter)
+            assert len(batched) == len(queries)
+            for query, results in zip(queries, batched):
+                single = await db.search_vectors("c", query, 7, metadata_filter)
+                assert [r.id for r in results] == [r.id for r in single]
+                np.testing.assert_allclose([r.score for r in results], [r.score for r in single], rtol=1e-5)
+
+        assert await db.search_vectors_batch("c", [], 7) == []
+        with pytest.raises(VectorDBError):
+            await db.search_vectors_batch("c", [[1.0, 0.0]], 7)
+
+    asyncio.run(scenario())
+
+
+def test_batch_search_through_the_ann_index(make_db):
+    async def scenario():
+        db = make_db(ann_threshold=500)
+        await db.create_collection("c", 8)
+        rng = np.random.default_rng(3)
+        vectors = rng.normal(size=(1200, 8)).astype(np.float32)
+        await db.add_vectors("c", vectors, [{"n": n} for n in range(1200)], [f"id-{n}" for n in range(1200)])
+        await db.wait_for_training("c")
+        queries = rng.normal(size=(6, 8)).astype(np.float32).tolist()
+        batched = await db.search_vectors_batch("c", queries, 5, nprobe=4)
+        for query, results in zip(queries, batched):
+            assert [r.id for r in results] == [r.id for r in await db.search_vectors("c", query, 5, nprobe=4)]
+
+    asyncio.run(scenario())
+
+
+async def quantized(db: DummyVectorDB, vectors: np.ndarray) -> DummyVectorDB:
+    await db.create_collection("c", vectors.shape[1])
+    await db.add_vectors("c", vectors, [{"n": n} for n in range(len(vectors))], [f"id-{n}" for n in range(len(vectors))])
+    await db.wait_for_training("c")
+    assert db.collections["c"].quantizer is not None
+    return db
+
+
+@pytest.mark.parametrize("kind", ["int8", "pq"])
+def test_rerank_restores_exact_scores(make_db, monkeypatch, kind):
+    monkeypatch.setattr(vector_db, "QUANTIZATION_THRESHOLD", 500)
+
+    async def scenario():
+        rng = np.random.default_rng(5)
+        vectors = rng.normal(size=(1000, 16)).astype(np.float32)
+        # Re-ranking every row must give the exact results.
+        db = await quantized(make_db(quantization=kind, rerank=100), vectors)
+        for query in rng.normal(size=(5, 16)).astype(np.float32):
+            results = await db.search_vectors("c", query.tolist(), 10)
+            assert [r.id for r in results] == brute_force(vectors, query, 10)
+            scores = exact_scores(vectors, query, "cosine")
+            expected = [scores[int(r.id[3:])] for r in results]
+            np.testing.assert_allclose([r.score for r in results], expected, rtol=1e-5)
+
+    asyncio.run(scenario())
+
+
+def test_rerank_improves_pq_recall(monkeypatch):
+    monkeypatch.setattr(vector_db, "QUANTIZATION_THRESHOLD", 500)
+
+    async def scenario():
+        rng = np.random.default_rng(6)
+        centers = rng.normal(size=(20, 16))
+        vectors = (centers[rng.integers(0, 20, 3000)] + 0.3 * rng.normal(size=(3000, 16))).astype(np.float32)
+        queries = vectors[rng.choice(3000, 10)] + 0.1 * rng.normal(size=(10, 16))
+
+        async def recall(rerank: int) -> float:
+            db = await quantized(DummyVectorDB(quantization="pq", rerank=rerank), vectors)
+            found = 0
+            for query in queries:
+                results = await db.search_vectors("c", query.tolist(), 10)
+                found += len({r.id for r in results} & set(brute_force(vectors, query, 10)))
+            return found / (10 * len(queries))
+
+        assert await recall(10) > await recall(0) + 0.3
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+def test_sharded_search_matches_a_single_shard(monkeypatch, metric):
+    monkeypatch.setattr(vector_db, "SHARD_SIZE", 64)
+
+    async def scenario():
+        rng = np.random.default_rng(7)
+        vectors = rng.normal(size=(1000, 8)).astype(np.float32)
+        metadata = [{"n": n, "parity": n % 2} for n in range(1000)]
+        dbs = [DummyVectorDB(search_threads=threads) for threads in (1, 4)]
+        for db in dbs:
+            await db.create_collection("c", 8, metric)
+            await db.add_vectors("c", vectors, metadata, [f"id-{n}" for n in range(1000)])
+            await db.delete_vectors("c", {"n": 10})
+        single, sharded = dbs
+        assert len(sharded._shards(sharded.collections["c"].snapshot(), None)) == 4
+
+        queries = rng.normal(size=(4, 8)).astype(np.float32).tolist()
+        for metadata_filter in (None, {"parity": 0}):
+            expected = await single.search_vectors_batch("c", queries, 25, metadata_filter)
+            actual = await sharded.search_vectors_batch("c", queries, 25, metadata_filter)
+            assert [[r.id for r in results] for results in actual] == [[r.id for r in results] for results in expected]
+        assert sharded._executor is not None
+        for db in dbs:
+            await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_merge_keeps_the_best_across_shards():
+    db = DummyVectorDB()
+    selections = [
+        (np.array([4, 1]), np.array([0.9, 0.2])),
+        (np.array([7, 8, 9]), np.array([0.95, 0.5, 0.1])),
+        (np.array([], dtype=np.int64), np.array([])),
+    ]
+    assert db._merge(selections, 3, higher_is_better=True) == ([7, 4, 8], [0.95, 0.9, 0.5])
+    distances = [(np.array([2, 3]), np.array([0.1, 0.4])), (np.array([5]), np.array([0.2]))]
+    assert db._merge(distances, 5, higher_is_better=False) == ([2, 5, 3], [0.1, 0.2, 0.4])